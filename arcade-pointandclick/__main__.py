@@ -8,567 +8,417 @@ If Python and Arcade are installed, this example can be run from
 the command line with: python -m arcade.examples.starting_template
 """
 # Standard Library
-from math import sqrt
-import os
-from pathlib import Path
+import argparse
 import random
+import time
 
 # Third Party
 from pyglet import gl
 import arcade
 
+# Local
+from .animation import Animator
+from .core import (
+    DEBUG, INVENTORY_COLUMNS, INVENTORY_ROWS, LOAD_KEY, SAVE_KEY, GameCore,
+    animations, log, path, profiler, render_log, startup_log, textures,
+    atlas_sprite)
+from .cursors import NativeCursors, native_cursors_supported
+from .eventlog import INFO
+from .hud import InventoryPanel
+from .preload import AssetLoader
+from .replay import Recorder
+from .text_cache import TextLayer
+
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 SCREEN_TITLE = "POINT AND CLICK TEST"
 
-UPDATES_PER_FRAME = 3
-
-MOVEMENT_SPEED = 300
-
-SPRITE_SCALING = 3
-
-# Constants used to track if the player is facing left or right
-RIGHT_FACING = 0
-LEFT_FACING = 1
-
-DEBUG = False
-# DEBUG = True
-
-# File paths for project and resources
-path = {}
-path['project'] = Path(os.path.dirname(__file__))
-path['resources'] = path['project'] / "resources"
-path['img'] = path['resources'] / "img"
-
-
-def load_texture_pair(filename):
-    '''
-    Load a texture pair, with the second being a mirror image.
-    '''
-    return [
-        arcade.load_texture(filename),
-        arcade.load_texture(filename, mirrored=True)
-    ]
-
-
-class Player(arcade.Sprite):
-    '''
-    Player Class
-    '''
-
-    def __init__(self):
-        # Set up parent class
-        super().__init__()
-
-        self.name = 'Player'
-
-        self.goto_x = 0
-        self.goto_y = 0
-
-        # Default to face-right
-        self.character_face_direction = RIGHT_FACING
-
-        # Used for flipping between image sequences
-        self.cur_texture = 0
-        self.scale = SPRITE_SCALING
+# Profiler overlay: toggle key, export key, and how often it redraws (each
+# redraw renders a new text texture)
+PROFILER_KEY = arcade.key.F3
+PROFILER_EXPORT_KEY = arcade.key.F4
+PROFILER_REFRESH_SECONDS = 0.5
 
-        self.Z_INDEX = 0
+# Cursor images, in cursor mode order, and the scale each is shown at
+CURSOR_IMAGES = ('default', 'examine', 'use', 'use_examine')
+CURSOR_SCALES = (0.5, 1, 0.5, 0.5)
 
-        # --- Load Textures ---
-        # Images from Kenney.nl's Asset Pack 3
-        # kenney_path = ":resources:images/animated_characters/"
-        # main_path = f"{kenney_path}female_adventurer/femaleAdventurer"
-        # main_path = f"{kenney_path}female_person/femalePerson"
-        # main_path = f"{kenney_path}male_person/malePerson"
-        # main_path = f"{kenney_path}male_adventurer/maleAdventurer"
-        # main_path = f"{kenney_path}zombie/zombie"
-        # main_path = f"{kenney_path}robot/robot"
+# Hourglass shown after a quick save or load, for at least this long
+BUSY_CURSOR_CLIP = "cursor.busy"
+BUSY_CURSOR_SCALE = 2
+BUSY_CURSOR_SECONDS = 0.7
 
-        # Load textures for idle standing
-        self.run_texture_pair = load_texture_pair(path['img'] / "6.png")
+# Loading screen progress bar, as a fraction of the window width
+LOADING_BAR_WIDTH = 0.6
+LOADING_BAR_HEIGHT = 20
 
-        # Load textures for walking
-        self.run_textures = []
-        for i in range(1, 15):
-            texture = load_texture_pair(path['img'] / f"{i}.png")
-            self.run_textures.append(texture)
-
-        # Set the initial texture
-        self.texture = self.run_texture_pair[0]
-
-        # Hit box will be set based on the first image used.
-        # If you want to specify
-        # a different hit box, you can do it like the code below.
-        # self.set_hit_box([[-22, -64], [22, -64], [22, 28], [-22, 28]])
-        # self.set_hit_box(self.texture.hit_box_points)
-
-    def update_animation(self, delta_time):
-        # Figure out if we need to flip face left or right
-        if self.change_x < 0 and self.character_face_direction == RIGHT_FACING:
-            self.character_face_direction = LEFT_FACING
-
-        elif (
-                self.change_x > 0 and
-                self.character_face_direction == LEFT_FACING
-             ):
-            self.character_face_direction = RIGHT_FACING
-
-        # Idle animation
-        if self.change_x == 0 and self.change_y == 0:
-            self.texture = self.run_texture_pair[self.character_face_direction]
-            return
-
-        # Walking animation
-        self.cur_texture += 1
-        if self.cur_texture > 13 * UPDATES_PER_FRAME:
-            self.cur_texture = 0
-
-        frames = self.cur_texture // UPDATES_PER_FRAME
-
-        self.texture = self.run_textures[frames][self.character_face_direction]
-
-    def on_update(self, delta_time):
-        self.center_x += self.change_x*delta_time
-        self.center_y += self.change_y*delta_time
-
-        # THIS CODE PREVENTS MOVING OFF SCREEN
-        # if self.left < 50:
-        #     self.left = 50
-        # elif self.right > SCREEN_WIDTH - 50:
-        #     self.right = SCREEN_WIDTH - 50
-
-        if self.bottom < 150:
-            self.bottom = 150
-        # elif self.top > SCREEN_HEIGHT - 50:
-        #     self.top = SCREEN_HEIGHT - 50
-
-        pad = 5  # Padding to detect player close to the goto position
-
-        if (
-            self.goto_x in range(
-                int(self.center_x-pad), int(self.center_x+pad)) and
-            self.goto_y in range(
-                int(self.bottom-pad), int(self.bottom)+pad)
-        ):
-            # If character near the goto position, stop the character
-            self.change_x = 0
-            self.change_y = 0
-
-        if DEBUG:
-            print(
-                 f"goto:{self.goto_x, self.goto_y} "
-                 f"center:{int(self.center_x),int(self.center_y)}\n"
-                 f"x:{self.change_x} y:{self.change_y}"
-                 )
-
-    def draw(self, **kwargs):
-        """ Draw the sprite. """
-
-        if self._sprite_list is None:
-            from arcade import SpriteList
-            self._sprite_list = SpriteList()
-            self._sprite_list.append(self)
-
-        self._sprite_list.draw(**kwargs)
-
-
-class Item(arcade.Sprite):
-    '''
-    Item Class
-    '''
-    def __init__(self, filename, scale,
-                 name, description,
-                 set_position,
-                 CAN_BE_PICKED_UP,
-                 level, **kwargs):
-
-        super().__init__(filename, scale)
-        self.name = name
-        self.description = description
-        self.center_x, self.center_y = set_position
-        self.CAN_BE_PICKED_UP = CAN_BE_PICKED_UP
-        self.IN_INVENTORY = kwargs.get('IN_INVENTORY', None)
-        self.Z_INDEX = 1
-        self.Z_INDEX = kwargs.get('Z_INDEX', None)
-        self.level = level
-
-    def examine(self):
-        return self.description
-
-    def use(self):
-        pass
+# Everything before this (the imports) is not counted in the startup time
+LAUNCHED = time.perf_counter()
 
-    def draw(self, **kwargs):
-        """ Draw the sprite. """
-
-        if self._sprite_list is None:
-            from arcade import SpriteList
-            self._sprite_list = SpriteList()
-            self._sprite_list.append(self)
-
-        self._sprite_list.draw(**kwargs)
-
-
-class Inventory(arcade.SpriteList):
-    '''
-    Inventory Class
-    '''
-    def __init__(self):
-        super().__init__()
-
-        self.items = []
-
-        self.items_ordered = []
-
-        self.items_visible = []
-        self.row_index = 0
-        self.visible_rows = [self.row_index, self.row_index + 1]
-
-    def add(self, item):
-        self.items.append(item)
-
-    def remove(self, item):
-        self.items.remove(item)
-
-    def update(self):
-        self.visible_rows = [self.row_index, self.row_index + 1]
-        self.items_ordered = [self.items[i*8:(i+1)*8] for i in range(
-            0, (len(self.items)//8)+1)]
-
-        if len(self.items) <= 8:
-            self.items_visible = self.items_ordered
-        else:
-            self.items_visible = self.items_ordered[
-                self.visible_rows[0]:self.visible_rows[1]+1
-                ]
-
-        for row in range(0, len(self.items_visible)):
-            for item in self.items_visible[row]:
-                item.center_x, item.center_y = (
-                    self.items_visible[row].index(item)*80+50, row*-80+130
-                )
-
-        for row in range(0, len(self.items_ordered)):
-            for item in self.items_ordered[row]:
-                if row not in self.visible_rows:
-                    item.center_x, item.center_y = (-100, -100)
-
-    def arrow(self, direction):
-        if direction == 'up' and self.row_index > 0:
-            print("Changed the row index (-1)")
-            self.row_index -= 1
-        elif (direction == 'down' and
-                self.row_index < len(self.items_ordered) - 2):
-            print("Changed the row index (+1)")
-            self.row_index += 1
-        print(self.row_index)
-        self.update()
-
-
-class Room():
-    '''
-    Room Class
-    '''
-    def __init__(self, name, number, filename, scale):
-        self.name = name
-        self.number = number
-        self.items = arcade.SpriteList()
-        self.clickable_area = []
-
-        self.room_dict = {
-            'transition_location': (0, 0),
-            'move_to_room': None,
-            'player_position': (0, 0),
-        },
-
-        self.connected_rooms = []
-
-        self.background = arcade.Sprite(filename, scale)
-        self.background.bottom = 150
-        self.background.left = 0
-
-    def move_to_room(self):
-        pass
+# How often the render stats (frames skipped, CPU use) are logged
+RENDER_STATS_SECONDS = 10
 
 
 class MyGame(arcade.Window):
     """
     Main application class.
 
-    NOTE: Go ahead and delete the methods you don't need.
-    If you do need a method, delete the 'pass' and replace it
-    with your own code. Don't leave 'pass' in this program.
+    The game itself is a GameCore; the window draws it and feeds it input.
+    With a recording file, that input is also logged for replay.
+
+    The cursor is drawn by the OS where pyglet allows it (cursor="native"),
+    otherwise as a sprite on top of everything else.
+
+    With render="dirty", a frame is only drawn when something on screen
+    changed: the game (walkers, animation, clicks, messages) sets
+    core.dirty, and the window sets its own dirty flag for the sprite
+    cursor, tooltip, labels and overlay. Otherwise on_draw does nothing
+    and flip() is skipped, so the last frame stays on screen.
     """
 
-    def __init__(self, width, height, title):
+    def __init__(self, width, height, title, seed=None, record=None,
+                 cursor="native", render="dirty"):
         super().__init__(width, height, title)
 
         arcade.set_background_color(arcade.color.AMAZON)
 
-        # If you have sprite lists, you should create them here,
-        # and set them to None
-        self.level_sprites = None
-        self.player_sprite = None
+        if record is not None and seed is None:
+            # A replay has to place the random items the same way
+            seed = random.randrange(2**32)
+        self.core = GameCore(seed=seed)
+
+        self.recorder = None
+        if record is not None:
+            self.recorder = Recorder(record, self.core)
+
+        # Decodes the startup images; None once the game is playable
+        self.loader = None
+        self.loader_seconds = None
+        self.loader_workers = None
+        self.first_frame_seconds = None
+
+        self.render_mode = render
+        self.dirty = True
+        self.frame_drawn = False
+        self.frames_drawn = 0
+        self.frames_skipped = 0
+        # (wall, CPU) clocks when the render stats were last taken
+        self.render_stats_start = (time.perf_counter(), time.process_time())
+        self.render_stats_timer = RENDER_STATS_SECONDS
+        self.cpu_use = 0.0
 
         self.cursor_texture_list = None
 
+        # Tooltip and message labels, drawn as one batch
         self.text_list = None
+        self.tooltip = None
+        self.message = None
+        self.profiler_overlay = None
+        self.profiler_refresh = 0
 
         self.text = None
 
         self.text_color = (0, 0, 0, 255)
 
-        self.goto_point = None
-
-        self.text_x = 200
-        self.text_y = 200
-
         self.current_cursor = None
+        self.cursor_style = cursor
+        self.native_cursors = None
+        self.busy_animator = None
+        self.busy_time = 0
+        self.cursor_busy = False
 
-        self.inventory = Inventory()
-
-        self.level_backgrounds = None
-
-        self.point_list = []
-
-        self.inventory_arrows = None
-
-        '''
-        ROOMS
-        '''
-        self.rooms = []
-
-        self.rooms.append(
-            Room('Start', 0, path['img'] / 'level00.png', 0.45))
-
-        self.rooms.append(
-            Room('Level 1', 1, path['img'] / 'level01.png', 0.45))
-
-        self.room = self.rooms[0]
-
-        self.room.clickable_area = [range(0, 800), range(178, 330)]
-
-    def room(self, level):
-        pass
-        # TODO load items for current level
+        self.inventory_panel = InventoryPanel(
+            width, columns=INVENTORY_COLUMNS, rows=INVENTORY_ROWS)
 
     def setup(self):
-        # Create your sprites and sprite lists here
-
-        # Sprite lists
-        self.level_sprites = arcade.SpriteList()
-        self.level_backgrounds = arcade.SpriteList()
-
-        # Sprites
+        """
+        Start decoding the startup images. on_update finishes setting up
+        once they are all in, drawing a progress bar until then.
+        """
+        self.loader = AssetLoader(path['preload'], textures, animations,
+                                  rooms=[self.core.room])
+        self.loader.start()
 
-        self.level_backgrounds.append(
-            arcade.Sprite(path['img'] / 'level00.png', 0.45),
-            )
-        # self.level_backgrounds[0].width = 800
-        self.level_backgrounds[0].bottom = 150
-        self.level_backgrounds[0].left = 0
+    def finish_setup(self):
+        """ Build the game and HUD, from the textures the loader made. """
+        self.core.setup()
 
-        # Set up the player
-        self.player_sprite = Player()
-        self.player_sprite.center_x = 50
-        self.player_sprite.center_y = 300
-        self.level_sprites.append(self.player_sprite)
+        cursor_files = [path['img'] / f"cursor/{i}.png"
+                        for i in CURSOR_IMAGES]
 
-        self.current_cursor = arcade.Sprite(
-            path['img'] / 'cursor/default.png', 0.5)
+        # The sprite cursor is also the fallback for native cursors
+        self.current_cursor = atlas_sprite(cursor_files[0], CURSOR_SCALES[0])
 
         self.cursor_texture_list = [
-            arcade.load_texture(
-                path['img'] / f"cursor/{i}.png") for i in (
-                'examine', 'use', 'use_examine', )]
+            textures.texture(filename) for filename in cursor_files[1:]]
 
         for texture in self.cursor_texture_list:
             self.current_cursor.append_texture(texture)
 
-        self.goto_point = [self.player_sprite.goto_x,
-                           self.player_sprite.goto_y]
+        self.busy_animator = Animator(animations.clip(BUSY_CURSOR_CLIP))
 
-        self.point_list.append(self.goto_point)
+        self.text_list = TextLayer()
+        self.tooltip = self.text_list.add_label(
+            font_size=18, width=200, align="center")
+        self.message = self.text_list.add_label(
+            font_size=14, width=600, align="center")
+        self.message.center_x = SCREEN_WIDTH/2
+        self.message.center_y = SCREEN_HEIGHT - 40
+        self.profiler_overlay = self.text_list.add_label(font_size=10)
 
-        self.text_list = arcade.SpriteList()
-
-        self.text_y = 0
-        self.text_x = 0
         self.text_color = (0, 0, 0, 255)
 
         self.text = ""
 
-        self.set_mouse_visible(False)
-
-        book = Item(
-            path['img'] / 'book.png', 1, 'book',
-            "It's a book. What else can I tell you?",
-            [
-                random.randint(0, 500),
-                random.randint(200, 500)
-            ],
-            True, 0, IN_INVENTORY=False, Z_INDEX=0)
-
-        self.level_sprites.append(book)
-
-        # rand_items = (
-        #     ('book', "It's a book.",
-        #         path['img'] / "book.png", 1),
-        #     ('key', "It's a key. It opens stuff.",
-        #         path['img'] / "key.png", 1),
-        #     ('firearm', "It's a gun. You should probably run.",
-        #         path['img'] / "firearm.png", 2.5),
-        #     ('brick', "It's a block of cocaine. Nifty.",
-        #         path['img'] / "brick.png", 2.5),
-        #     ("Hammer", "It's hammer time.",
-        #         path['img'] / "hammer.png", 2.5),
-        #     ('sword', "It's a sword.",
-        #         path['img'] / "sword.png", 1),
-        # )
-
-        # for i in range(20):
-        #     item = random.choice(rand_items)
-        #     self.level_sprites.append(
-        #         Item(
-        #             item[2], item[3], item[0], item[1],
-        #             [random.randint(0, 800), random.randint(200, 600)],
-        #             True, 0, IN_INVENTORY=False, Z_INDEX=0))
-
-        self.inventory_arrows = arcade.SpriteList()
-
-        self.inventory_arrows.append(
-            arcade.Sprite(
-                path['img'] / 'ui/arrow_up.png', 4,
-                center_x=725, center_y=125))
-
-        self.inventory_arrows.append(
-            arcade.Sprite(
-                path['img'] / 'ui/arrow_down.png', 4,
-                center_x=725, center_y=50))
-
-        self.level_sprites.append(
-            Item(
-                path['img'] / 'tires.png', 0.45, 'Tires',
-                "It's just a pile of tires...weirdo.",
-                [700, 300], False, 0)
-            )
-        self.level_sprites.append(
-            Item(
-                path['img'] / 'hydrant.png', 0.45, 'Fire hydrant',
-                "Y'know, for dogs to piss on.",
-                [300, 320], False, 0)
-            )
+        if self.cursor_style == "native" and native_cursors_supported():
+            self.native_cursors = NativeCursors(
+                self, cursor_files, CURSOR_SCALES, animations,
+                animation_scale=BUSY_CURSOR_SCALE)
+            self.native_cursors.show(self.core.cursor_mode)
+            self.set_mouse_visible(True)
+        else:
+            self.set_mouse_visible(False)
 
     def on_draw(self):
         """
         Render the screen.
         """
+        if self.loader is not None:
+            self.draw_loading()
+            self.frame_drawn = True
+            return
+
+        if self.core.dirty:
+            self.dirty = True
+            self.core.dirty = False
+        if self.render_mode == "dirty" and not self.dirty:
+            self.frame_drawn = False
+            self.frames_skipped += 1
+            return
+
+        with profiler.scope("draw"):
+            self.draw()
+        self.dirty = False
+        self.frame_drawn = True
+        self.frames_drawn += 1
+
+        if self.first_frame_seconds is None:
+            self.report_startup()
+
+    def flip(self):
+        # A skipped frame leaves the last one on screen. pyglet can flip
+        # before __init__ is done, too.
+        if getattr(self, 'frame_drawn', True):
+            super().flip()
+
+    def on_expose(self):
+        """ The OS lost what was on screen (uncovered, say). """
+        self.dirty = True
+
+    def render_stats(self):
+        """
+        Frames drawn and skipped since the last call, and the share of a
+        CPU core the process used meanwhile.
+        """
+        wall, cpu = time.perf_counter(), time.process_time()
+        start_wall, start_cpu = self.render_stats_start
+        self.render_stats_start = (wall, cpu)
+        self.cpu_use = (cpu - start_cpu) / max(wall - start_wall, 1e-9)
+
+        drawn, skipped = self.frames_drawn, self.frames_skipped
+        self.frames_drawn = self.frames_skipped = 0
+        if render_log.info:
+            render_log.event(INFO, "frames", drawn=drawn, skipped=skipped,
+                             cpu=round(self.cpu_use, 3),
+                             mode=self.render_mode)
+        return drawn, skipped
+
+    def draw_loading(self):
+        """ The loading screen: a bar filling up as images come in. """
+        arcade.start_render()
+
+        width = self.width * LOADING_BAR_WIDTH
+        left = (self.width - width) / 2
+        bottom = (self.height - LOADING_BAR_HEIGHT) / 2
+        top = bottom + LOADING_BAR_HEIGHT
+        arcade.draw_lrtb_rectangle_filled(
+            left, left + width * self.loader.progress, top, bottom,
+            arcade.color.WHITE)
+        arcade.draw_lrtb_rectangle_outline(
+            left, left + width, top, bottom, arcade.color.WHITE, 2)
+
+    def report_startup(self):
+        """ Log how long it took to get to the first playable frame. """
+        self.first_frame_seconds = time.perf_counter() - LAUNCHED
+        if startup_log.info:
+            startup_log.event(INFO, "first frame",
+                              seconds=self.first_frame_seconds,
+                              assets_seconds=self.loader_seconds,
+                              workers=self.loader_workers)
+
+    def draw(self):
+        """ Everything on_draw does, inside its profiler scope. """
+        core = self.core
+        player_sprite = core.player_sprite
 
         # This command should happen before we start drawing. It will clear
         # the screen to the background color, and erase what we drew last frame
         arcade.start_render()
 
-        self.room.background.draw()
+        with profiler.scope("draw.room"):
+            core.room.background.draw()
 
-        arcade.draw_rectangle_filled(SCREEN_WIDTH/2, 150/2, SCREEN_WIDTH, 200,
-                                     arcade.csscolor.BLACK)
+        # Panel and inventory squares, baked into a single draw
+        with profiler.scope("draw.hud"):
+            self.inventory_panel.draw()
 
-        # Draw inventory squares
-        for i in range(8):
-            for j in range(2):
-                arcade.draw_rectangle_filled(
-                    i*80+50, j*80+50,
-                    64, 64, arcade.csscolor.RED)
+            core.inventory_arrows.draw(filter=gl.GL_NEAREST)
 
-        self.inventory_arrows.draw(filter=gl.GL_NEAREST)
+            # Only the items on the current page are in the list
+            core.inventory.draw(filter=gl.GL_NEAREST)
 
         if DEBUG:
-            for sprite in self.inventory_arrows:
+            for sprite in core.inventory_arrows:
                 sprite.draw_hit_box(color=arcade.csscolor.RED)
 
-        for sprite in self.level_sprites:
-            sprite.draw(filter=gl.GL_NEAREST)
+        # Draw moving sprites between their last two simulated positions
+        with profiler.scope("draw.world"):
+            core.interpolator.apply(core.clock.alpha)
+            core.level_sprites.draw(filter=gl.GL_NEAREST)
+            core.interpolator.restore()
 
         if DEBUG:
-            arcade.draw_point(self.player_sprite.center_x,
-                              self.player_sprite.center_y,
+            arcade.draw_point(player_sprite.center_x,
+                              player_sprite.center_y,
                               arcade.csscolor.RED, 5)
-            arcade.draw_point(self.player_sprite.goto_x,
-                              self.player_sprite.goto_y,
+            arcade.draw_point(player_sprite.goto_x,
+                              player_sprite.goto_y,
                               arcade.csscolor.RED, 5)
-            arcade.draw_line(self.player_sprite.center_x,
-                             self.player_sprite.center_y,
-                             self.player_sprite.goto_x,
-                             self.player_sprite.goto_y,
-                             arcade.csscolor.RED, 2)
-
-        self.text_list.draw()
+            if player_sprite.path:
+                arcade.draw_line_strip(
+                    [(player_sprite.center_x,
+                      player_sprite.bottom)] + player_sprite.path,
+                    arcade.csscolor.RED, 2)
 
-        arcade.draw_text(self.text,
-                         self.text_x, self.text_y,
-                         self.text_color, 18,
-                         width=200, align="center",
-                         anchor_x="center", anchor_y="center")
+        with profiler.scope("draw.text"):
+            self.text_list.draw()
 
-        self.current_cursor.draw()
+        if self.native_cursors is None:
+            with profiler.scope("draw.cursor"):
+                self.current_cursor.draw()
 
         if DEBUG:
             arcade.draw_circle_outline(
-                self.player_sprite.center_x, self.player_sprite.center_y,
+                player_sprite.center_x, player_sprite.center_y,
                 200, arcade.csscolor.RED, 2, 30
             )
 
-        # Call draw() on all your sprite lists below
-
     def on_update(self, delta_time):
         """
-        All the logic to move, and the game logic goes here.
-        Normally, you'll call update() on the sprite lists that
-        need it.
+        Advance the game, then bring the HUD up to date with it.
         """
+        if self.loader is not None:
+            if self.loader.poll():
+                self.loader_seconds = self.loader.elapsed
+                self.loader_workers = self.loader.workers
+                self.loader = None
+                self.finish_setup()
+            return
 
-        for sprite in self.level_sprites:
-            sprite.on_update(delta_time)
-
-        self.player_sprite.update_animation(delta_time)
-
-        # self.level_sprites.update()
+        with profiler.scope("update"):
+            self.core.update(delta_time)
 
-        self.current_cursor.update()
+            self.update_cursor(delta_time)
 
-        for sprite in self.level_sprites:
-            if sprite is self.player_sprite:
-                pass
-            elif sprite.bottom < self.player_sprite.bottom:
-                sprite.Z_INDEX = 1
-            else:
-                sprite.Z_INDEX = -1
+            # No-op unless the message actually changed
+            if self.message.set_text(self.core.message, arcade.color.WHITE):
+                self.dirty = True
 
-        self.level_sprites = sorted(
-            self.level_sprites, key=lambda x: x.Z_INDEX
-        )
+        self.render_stats_timer -= delta_time
+        if self.render_stats_timer <= 0:
+            self.render_stats_timer = RENDER_STATS_SECONDS
+            self.render_stats()
 
-        # TODO Move to on_mouse_release
-        if (self.player_sprite.center_x > 790 and
-                self.player_sprite.center_y < 350):
+        if profiler.enabled:
+            self.profiler_refresh -= delta_time
+            if self.profiler_refresh <= 0:
+                self.profiler_refresh = PROFILER_REFRESH_SECONDS
+                self.show_profiler_overlay()
 
-            self.room = self.rooms[1]
-            self.room.clickable_area = [range(0, 800), range(0, 600)]
-            self.player_sprite.set_position(60, 300)
-            # self.player_sprite.goto_x,
-            # self.player_sprite.goto_y = self.player_sprite._get_position()
-            self.player_sprite.change_x = 0
-            self.player_sprite.change_y = 0
-            self.player_sprite.scale = 1.5
-
-            # TODO BUG Items being removed from inventory
-            self.level_sprites = [self.player_sprite]
+    def show_cursor(self):
+        """ Show the cursor for what the next click will do. """
+        mode = self.core.cursor_mode
+        if self.native_cursors is not None:
+            self.native_cursors.show(mode)
+        else:
+            self.current_cursor.set_texture(mode)
+            self.current_cursor.scale = CURSOR_SCALES[mode]
 
-            for item in self.room.items:
-                self.level_sprites.append(item)
+    def update_cursor(self, delta_time):
+        """
+        Play the busy cursor for a moment after a quick save or load, and
+        for as long as the save is still being written.
+        """
+        self.busy_time -= delta_time
+        busy = self.busy_time > 0 or (self.cursor_busy and
+                                      self.core.saves.writing)
+        if busy:
+            if self.native_cursors is not None:
+                self.native_cursors.play(BUSY_CURSOR_CLIP)
+                self.native_cursors.update(delta_time)
+            else:
+                if not self.cursor_busy:
+                    self.busy_animator.play(self.busy_animator.clip,
+                                            restart=True)
+                self.busy_animator.update(delta_time)
+                self.current_cursor.texture = self.busy_animator.texture()
+                self.current_cursor.scale = BUSY_CURSOR_SCALE
+                self.dirty = True
+        elif self.cursor_busy:
+            self.show_cursor()
+            self.dirty = True
+        self.cursor_busy = busy
+
+    def show_profiler_overlay(self):
+        """
+        Refresh the phase timings (and where the player is heading) shown
+        in the top left corner.
+        """
+        player_sprite = self.core.player_sprite
+        self.dirty = True
+        self.profiler_overlay.set_text(
+            f"{profiler.summary()}\n"
+            f"player {int(player_sprite.center_x)}, "
+            f"{int(player_sprite.bottom)} "
+            f"goto {int(player_sprite.goto_x)}, {int(player_sprite.goto_y)}\n"
+            f"first frame {self.first_frame_seconds:.2f} s "
+            f"(assets {self.loader_seconds:.2f} s)\n"
+            f"render {self.render_mode}: {self.frames_drawn} drawn, "
+            f"{self.frames_skipped} skipped, CPU {self.cpu_use:.0%}",
+            arcade.color.WHITE)
+        self.profiler_overlay.left = 10
+        self.profiler_overlay.top = SCREEN_HEIGHT - 10
+
+    def export_profile(self):
+        """ Write the recorded phases out as a Chrome trace and as CSV. """
+        stem = time.strftime("profile-%Y%m%d-%H%M%S")
+        path['profiles'].mkdir(parents=True, exist_ok=True)
+        profiler.export_chrome_trace(path['profiles'] / f"{stem}.json")
+        profiler.export_csv(path['profiles'] / f"{stem}.csv")
+        self.core.show_message(
+            f"Saved profiles/{stem}.json and profiles/{stem}.csv")
+
+    def on_resize(self, width, height):
+        """
+        Called whenever the window is resized.
+        """
+        super().on_resize(width, height)
+        self.dirty = True
 
-            for item in self.inventory.items:
-                self.level_sprites.append(item)
+        # pyglet can fire this from inside Window.__init__
+        panel = getattr(self, 'inventory_panel', None)
+        if panel is not None:
+            panel.set_layout(width=width)
 
     def on_key_press(self, key, key_modifiers):
         """
@@ -577,7 +427,28 @@ class MyGame(arcade.Window):
         For a full list of keys, see:
         http://arcade.academy/arcade.key.html
         """
-        pass
+        # Nothing to play yet
+        if self.loader is not None:
+            return
+
+        # The profiler keys only touch the window, so replays skip them
+        if key == PROFILER_KEY:
+            if profiler.toggle():
+                self.profiler_refresh = 0
+            else:
+                profiler.clear()
+                self.profiler_overlay.set_text("")
+            self.dirty = True
+
+        elif key == PROFILER_EXPORT_KEY and profiler.enabled:
+            self.export_profile()
+
+        else:
+            if self.recorder is not None:
+                self.recorder.key(key)
+            self.core.key_press(key)
+            if key in (SAVE_KEY, LOAD_KEY):
+                self.busy_time = BUSY_CURSOR_SECONDS
 
     def on_key_release(self, key, key_modifiers):
         """
@@ -589,43 +460,44 @@ class MyGame(arcade.Window):
         """
         Called whenever the mouse moves.
         """
-        self.current_cursor.center_x = x
-        self.current_cursor.center_y = y
-
-        # Set text position to cursor position (floating bit above the cursor)
-        # This creates a tooltip feel.
-        self.text_x = x
-        self.text_y = y+25  # Floating a little above the cursor
+        if self.loader is not None:
+            return
 
-        # For loop for each item
+        if self.recorder is not None:
+            self.recorder.motion(x, y)
 
-        for sprite in self.level_sprites:
-            sprite_x_values, sprite_y_values = [], []
-            for point in sprite.get_adjusted_hit_box():
-                sprite_x_values.append(int(point[0]))
-                sprite_y_values.append(int(point[1]))
+        if self.native_cursors is None:
+            self.current_cursor.center_x = x
+            self.current_cursor.center_y = y
+            self.dirty = True
 
-            sprite_x_values = range(min(sprite_x_values), max(sprite_x_values))
-            sprite_y_values = range(min(sprite_y_values), max(sprite_y_values))
+        # Set text position to cursor position (floating bit above the cursor)
+        # This creates a tooltip feel.
+        self.tooltip.center_x = x
+        self.tooltip.center_y = y+25  # Floating a little above the cursor
 
-        # for item in self.level_sprites:
-        #     x_range = range(int(item.center_x)-pad, int(item.center_x)+pad)
-        #     y_range = range(int(item.center_y)-pad, int(item.center_y)+pad)
+        with profiler.scope("hover"):
+            sprite = self.core.sprite_at(x, y)
 
-            if x in sprite_x_values and y in sprite_y_values:
-                # Change the text to the item name and display it
-                self.text = sprite.name
-                self.text_color = (255, 255, 255, 255)
-                break
-            else:
-                # Make the text invisible
-                self.text = ""
-                self.text_color = (0, 0, 0, 0)
+        if sprite is not None:
+            # Change the text to the item name and display it
+            self.text = sprite.name
+            self.text_color = (255, 255, 255, 255)
+        else:
+            # Make the text invisible
+            self.text = ""
+            self.text_color = (0, 0, 0, 0)
 
         if DEBUG:
             self.text = f"{self.text}\n{x,y}"
             self.text_color = (255, 255, 255, 255)
 
+        with profiler.scope("tooltip"):
+            changed = self.tooltip.set_text(self.text, self.text_color)
+        # A visible tooltip follows the mouse
+        if changed or self.text:
+            self.dirty = True
+
     def on_mouse_press(self, x, y, button, key_modifiers):
         """
         Called when the user presses a mouse button.
@@ -636,143 +508,55 @@ class MyGame(arcade.Window):
         """
         Called when a user releases a mouse button.
         """
+        if self.loader is not None:
+            return
 
-        self.x = x
-        self.y = y
-
-        left_click = button == arcade.MOUSE_BUTTON_LEFT
-        right_click = button == arcade.MOUSE_BUTTON_RIGHT
-        middle_click = button == arcade.MOUSE_BUTTON_MIDDLE
-
-        # move_cursor = self.current_cursor.textures[0]
-        use_cursor = self.current_cursor.textures[2]
-        examine_cursor = self.current_cursor.textures[1]
-
-        # is_move_cursor = self.current_cursor.texture == move_cursor
-        is_use_cursor = self.current_cursor.texture == use_cursor
-        is_examine_cursor = self.current_cursor.texture == examine_cursor
-
-        if (right_click and is_examine_cursor or
-                middle_click and is_use_cursor):
-            self.current_cursor.set_texture(0)
-            self.current_cursor.scale = 0.5
-
-        elif right_click:
-            self.current_cursor.set_texture(1)
-            self.current_cursor.scale = 1
-
-        elif middle_click:
-            self.current_cursor.set_texture(2)
-            self.current_cursor.scale = 0.5
-
-        # Level items (not picked up)
-        for sprite in self.level_sprites:
-
-            sprite_x_values, sprite_y_values = [], []
-            for point in sprite.get_adjusted_hit_box():
-                sprite_x_values.append(int(point[0]))
-                sprite_y_values.append(int(point[1]))
-
-            sprite_x_values = range(min(sprite_x_values), max(sprite_x_values))
-            sprite_y_values = range(min(sprite_y_values), max(sprite_y_values))
-
-            distance_x = self.player_sprite.center_x - x
-            distance_y = self.player_sprite.bottom - y
-            distance = int(sqrt(distance_x**2+distance_y**2))
-
-            if x in sprite_x_values and y in sprite_y_values:
-                if DEBUG:
-                    print(self.player_sprite.center_y, sprite_y_values)
-
-                if left_click and is_use_cursor and distance < 200:
-
-                    if not sprite.IN_INVENTORY and sprite.CAN_BE_PICKED_UP:
-                        self.inventory.add(sprite)
-                        self.inventory.update()
-                        print(f"You picked up the {sprite.name}.")
-                        # sprite.center_x, sprite.center_y = (100, 100)
-                        sprite.IN_INVENTORY = True
-                        # for sprite in self.level_sprites:
-                        #     if sprite is not self.player_sprite:
-                        #         sprite.kill()
-                    break
-
-                # elif sprite.IN_INVENTORY:
-                    # self.current_cursor.set_texture(0)
-
-                if left_click and is_examine_cursor:
-                    print(sprite.description)
-                    # self.current_cursor.set_texture(1)
-                    break
-        else:
-            if (
-                    left_click
-                    and int(x) in tuple(self.room.clickable_area[0])
-                    and int(y) in tuple(self.room.clickable_area[1])
-            ):
-                self.current_cursor.set_texture(0)
-                self.current_cursor.scale = 0.5
-                if DEBUG:
-                    print("Moving to mouse position!")
-
-                self.player_sprite.goto_x = x
-                self.player_sprite.goto_y = y
-
-                dx = (x - self.player_sprite.center_x)
-                dy = (y - self.player_sprite.bottom)
-                magnitude = sqrt(dx**2+dy**2)
-                self.player_sprite.change_x = MOVEMENT_SPEED*(dx)/magnitude
-                self.player_sprite.change_y = MOVEMENT_SPEED*(dy)/magnitude
-
-        arrow_x_values = []
-        arrow_y_values = []
-
-        for arrow in range(2):
-            for point in self.inventory_arrows[arrow].get_adjusted_hit_box():
-                arrow_x_values.append(int(point[0]))
-                arrow_y_values.append(int(point[1]))
-
-            arrow_x_range = range(min(arrow_x_values), max(arrow_x_values))
-            arrow_y_range = range(min(arrow_y_values), max(arrow_y_values))
-
-            if left_click and x in arrow_x_range and y in arrow_y_range:
-                if arrow == 0:
-                    print("Clicked the up arrrow!")
-                    self.inventory.arrow('up')
-                    break
-                if arrow == 1:
-                    print("Clicked the down arrow!")
-                    self.inventory.arrow('down')
-
-        # # TODO Inventory items
-        # for item in self.inventory:
-        #     x_range = range(item.center_x-pad, item.center_x+pad)
-        #     y_range = range(item.center_y-pad, item.center_y+pad)
-        #
-        #     if x in x_range and y in y_range:
-        #         pass
-        #
-        # else:
-        #     if (item not in self.level_sprites
-        #             and button is not arcade.MOUSE_BUTTON_MIDDLE
-        #             and int(y) > 150):
-        #         self.current_cursor.set_texture(0)
-        #         if DEBUG:
-        #             print("Moving to mouse position!")
-        #
-        #         self.player_sprite.goto_x = x
-        #         self.player_sprite.goto_y = y
-        #
-        #         dx = (x - self.player_sprite.center_x)
-        #         dy = (y - self.player_sprite.bottom)
-        #         magnitude = sqrt(dx**2+dy**2)
-        #         self.player_sprite.change_x = MOVEMENT_SPEED*(dx)/magnitude
-        #         self.player_sprite.change_y = MOVEMENT_SPEED*(dy)/magnitude
+        if self.recorder is not None:
+            self.recorder.release(x, y, button)
+
+        with profiler.scope("click"):
+            self.core.click(x, y, button)
+
+        # The cursor shows what the next click will do
+        if not self.cursor_busy:
+            self.show_cursor()
+
+    def on_close(self):
+        if self.loader is None:
+            self.render_stats()
+        if self.recorder is not None:
+            self.recorder.finish()
+        super().on_close()
 
 
 def main():
     """ Main method """
-    game = MyGame(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+    parser = argparse.ArgumentParser(description=SCREEN_TITLE)
+    parser.add_argument("--record", metavar="FILE",
+                        help="log input for replay.py")
+    parser.add_argument("--seed", type=int,
+                        help="seed for random item placement")
+    parser.add_argument("--cursor", choices=("native", "sprite"),
+                        default="native",
+                        help="let the OS draw the mouse cursor, or draw it "
+                             "as a sprite (native needs pyglet 1.5.11+)")
+    parser.add_argument("--events", metavar="FILE",
+                        help="write game events as JSON lines ('-' for "
+                             "stderr)")
+    parser.add_argument("--render", choices=("dirty", "always"),
+                        default="dirty",
+                        help="draw only frames where something changed, or "
+                             "every frame")
+    parser.add_argument("--event-level", default="info", metavar="LEVELS",
+                        help="e.g. info or info,inventory=debug")
+    args = parser.parse_args()
+
+    if args.events is not None:
+        log.open(args.events, args.event_level)
+
+    game = MyGame(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE,
+                  seed=args.seed, record=args.record, cursor=args.cursor,
+                  render=args.render)
     game.setup()
     arcade.run()
 
@@ -0,0 +1,174 @@
+"""
+Batched movement for walking characters.
+
+Each sprite used to move itself in on_update, one Python method call and a
+handful of attribute lookups per walker per step. ActorPool keeps every
+walking sprite's feet position, velocity, current waypoint, speed and
+facing in contiguous NumPy arrays, and each step moves all of them at
+once: integrate, snap the ones that reached their waypoint, clamp to the
+floor and flip facing, as whole-array operations. Only the walkers that
+reached a waypoint drop back into Python to pick up the next one, and the
+new positions go back to the sprites in a single loop.
+
+A sprite joins the pool when it starts walking and leaves when it arrives
+or is stopped, so standing characters cost nothing. Removal swaps the last
+walker into the freed row, keeping the arrays dense.
+
+Pooled sprites need path, change_x, change_y and character_face_direction
+attributes, which the pool keeps up to date for their animation.
+"""
+# Third Party
+import numpy as np
+
+# Local
+from .spatial import move_sprites
+
+# Rows allocated up front; the arrays double when they fill
+INITIAL_CAPACITY = 64
+
+RIGHT_FACING = 0
+LEFT_FACING = 1
+
+
+class ActorPool():
+    '''
+    Walking sprites, moved together each fixed step.
+    '''
+    def __init__(self, floor=None, capacity=INITIAL_CAPACITY):
+        # Lowest y anyone's feet may go
+        self.floor = floor
+
+        self.sprites = []
+        self.rows = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        count = len(self.sprites)
+        old = getattr(self, "position", None)
+        arrays = {
+            "position": np.zeros((capacity, 2)),
+            "velocity": np.zeros((capacity, 2)),
+            "target": np.zeros((capacity, 2)),
+            "speed": np.zeros(capacity),
+            # center_y - bottom, to turn feet back into sprite positions
+            "offset": np.zeros(capacity),
+            "facing": np.zeros(capacity, dtype=np.int8),
+        }
+        for name, array in arrays.items():
+            if old is not None:
+                array[:count] = getattr(self, name)[:count]
+            setattr(self, name, array)
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def __contains__(self, sprite):
+        return sprite in self.rows
+
+    def walk(self, sprite, path, speed):
+        """ Start sprite walking through a list of (x, y) feet positions. """
+        sprite.path = list(path)
+        if not sprite.path:
+            self.stop(sprite)
+            return
+
+        row = self.rows.get(sprite)
+        if row is None:
+            row = len(self.sprites)
+            if row == len(self.position):
+                self._allocate(2 * row)
+            self.sprites.append(sprite)
+            self.rows[sprite] = row
+
+        self.position[row] = (sprite.center_x, sprite.bottom)
+        self.speed[row] = speed
+        self.facing[row] = sprite.character_face_direction
+        if not self._head_for_waypoint(row):
+            # Already standing on every waypoint
+            self.stop(sprite)
+
+    def stop(self, sprite):
+        sprite.path = []
+        sprite.change_x = 0
+        sprite.change_y = 0
+
+        row = self.rows.pop(sprite, None)
+        if row is None:
+            return
+        last = len(self.sprites) - 1
+        if row != last:
+            # Move the last walker into the hole
+            moved = self.sprites[last]
+            self.sprites[row] = moved
+            self.rows[moved] = row
+            for array in (self.position, self.velocity, self.target,
+                          self.speed, self.offset, self.facing):
+                array[row] = array[last]
+        self.sprites.pop()
+
+    def _head_for_waypoint(self, row):
+        """ Aim a walker at its next waypoint. False if it has none left. """
+        sprite = self.sprites[row]
+        position = self.position[row]
+        while sprite.path:
+            x, y = sprite.path[0]
+            if self.floor is not None:
+                # Below the floor it could never arrive, only slide along it
+                y = max(y, self.floor)
+            dx = x - position[0]
+            dy = y - position[1]
+            magnitude = np.hypot(dx, dy)
+            if magnitude == 0:
+                sprite.path.pop(0)
+                continue
+
+            speed = self.speed[row]
+            self.target[row] = (x, y)
+            self.velocity[row] = (speed*dx/magnitude, speed*dy/magnitude)
+            sprite.change_x, sprite.change_y = self.velocity[row].tolist()
+            # Frames can have different hit boxes, so re-measure each leg
+            self.offset[row] = sprite.center_y - sprite.bottom
+            return True
+        return False
+
+    def update(self, delta_time):
+        """ Move every walker by one step and write them back. """
+        count = len(self.sprites)
+        if not count:
+            return
+
+        position = self.position[:count]
+        velocity = self.velocity[:count]
+        target = self.target[:count]
+
+        # Snap to the waypoint rather than overshoot it
+        to_target = target - position
+        remaining = np.hypot(to_target[:, 0], to_target[:, 1])
+        arrived = remaining <= self.speed[:count] * delta_time
+
+        position += velocity * delta_time
+        position[arrived] = target[arrived]
+
+        if self.floor is not None:
+            np.maximum(position[:, 1], self.floor, out=position[:, 1])
+
+        facing = self.facing[:count]
+        was_facing = facing.copy()
+        facing[velocity[:, 0] < 0] = LEFT_FACING
+        facing[velocity[:, 0] > 0] = RIGHT_FACING
+        turned = np.flatnonzero(facing != was_facing).tolist()
+
+        # Back to the sprites, before anyone leaves the pool
+        sprites = list(self.sprites)
+        move_sprites(sprites, position[:, 0].tolist(),
+                     (position[:, 1] + self.offset[:count]).tolist())
+        for row in turned:
+            sprites[row].character_face_direction = int(facing[row])
+
+        # Walkers at a waypoint take the next leg, or stop. Go backwards so
+        # swapping the last row into a stopped one can't skip anybody.
+        for row in np.flatnonzero(arrived)[::-1].tolist():
+            sprite = sprites[row]
+            sprite.path.pop(0)
+            if not self._head_for_waypoint(row):
+                self.stop(sprite)
@@ -0,0 +1,149 @@
+"""
+Data-driven sprite animation.
+
+Clips are described in resources/animations.json, by name under "clips":
+
+    "player.walk": {"frames": ["1.png", "2.png"], "duration": 0.05,
+                    "loop": "loop", "mirrored": true}
+
+frames are images under resources/img. duration is seconds per frame,
+either one number for every frame or a list with one per frame. loop is
+"loop", "once" (hold the last frame) or "pingpong". Mirrored clips also get
+a left-facing copy of every frame.
+
+Each clip is loaded once into a FrameTable, an immutable tuple of its
+textures per facing and the time each frame ends. frame_table builds one
+from a clip definition with any loader, so the same clip file can time
+things that aren't arcade textures, like native mouse cursors. Every
+actor playing the clip shares that table. All an actor holds is an
+Animator: which clip it is playing and how far into it, so a crowd of
+NPCs costs one small object each and no texture loads.
+"""
+# Standard Library
+from bisect import bisect_right
+from collections import namedtuple
+from functools import partial
+from itertools import accumulate
+import json
+
+LOOP = "loop"
+ONCE = "once"
+PINGPONG = "pingpong"
+LOOP_MODES = (LOOP, ONCE, PINGPONG)
+
+FrameTable = namedtuple("FrameTable", [
+    "name", "textures", "ends", "length", "loop",
+])
+
+
+class AnimationError(Exception):
+    pass
+
+
+def frame_index(table, time):
+    """ Which frame of a clip shows time seconds after it started. """
+    length = table.length
+    if table.loop == LOOP:
+        time %= length
+    elif table.loop == PINGPONG:
+        time %= 2 * length
+        if time >= length:
+            time = 2 * length - time
+    return min(bisect_right(table.ends, time), len(table.ends) - 1)
+
+
+def frame_table(name, data, img_dir, load, load_mirrored=None):
+    '''
+    Build the FrameTable for clip definition data, loading each frame with
+    load(filename), and load_mirrored(filename) for the left-facing copy of
+    a mirrored clip.
+    '''
+    filenames = [img_dir / frame for frame in data["frames"]]
+    if not filenames:
+        raise AnimationError(f"Clip {name} has no frames")
+
+    durations = data.get("duration", 0.1)
+    if not isinstance(durations, list):
+        durations = [durations] * len(filenames)
+    if len(durations) != len(filenames):
+        raise AnimationError(f"Clip {name} has {len(filenames)} frames "
+                             f"but {len(durations)} durations")
+
+    loop = data.get("loop", LOOP)
+    if loop not in LOOP_MODES:
+        raise AnimationError(f"Clip {name} has unknown loop mode {loop}")
+
+    right = tuple(load(filename) for filename in filenames)
+    if data.get("mirrored", False) and load_mirrored is not None:
+        left = tuple(load_mirrored(filename) for filename in filenames)
+    else:
+        left = right
+
+    ends = tuple(accumulate(durations))
+    return FrameTable(name, (right, left), ends, ends[-1], loop)
+
+
+class AnimationLibrary():
+    '''
+    FrameTables by clip name, built from the clip file the first time each
+    is asked for.
+    '''
+    def __init__(self, source_path, img_dir, textures):
+        self.source_path = source_path
+        self.img_dir = img_dir
+        self.textures = textures
+        self.definitions = None
+        self.tables = {}
+
+    def _load_definitions(self):
+        with open(self.source_path) as source_file:
+            self.definitions = json.load(source_file)["clips"]
+
+    def definition(self, name):
+        """ The clip file's entry for name. """
+        if self.definitions is None:
+            self._load_definitions()
+        try:
+            return self.definitions[name]
+        except KeyError:
+            raise AnimationError(f"No animation clip called {name}")
+
+    def clip(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = frame_table(
+                name, self.definition(name), self.img_dir,
+                self.textures.texture,
+                partial(self.textures.texture, mirrored=True))
+        return table
+
+
+class Animator():
+    '''
+    One actor's place in the clip it is playing.
+    '''
+    __slots__ = ("clip", "time")
+
+    def __init__(self, clip):
+        self.clip = clip
+        self.time = 0.0
+
+    def play(self, clip, restart=False):
+        """ Switch to clip, from its start. Carries on if it is playing. """
+        if clip is not self.clip or restart:
+            self.clip = clip
+            self.time = 0.0
+
+    def update(self, delta_time):
+        self.time += delta_time
+        if self.clip.loop != ONCE:
+            # Keep the clock small so it doesn't lose precision
+            self.time %= 2 * self.clip.length
+
+    @property
+    def finished(self):
+        return self.clip.loop == ONCE and self.time >= self.clip.length
+
+    def texture(self, facing=0):
+        """ The frame to show now, for facing 0 (right) or 1 (left). """
+        return self.clip.textures[facing][frame_index(self.clip, self.time)]
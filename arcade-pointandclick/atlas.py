@@ -0,0 +1,314 @@
+"""
+Texture atlas build step and loader.
+
+Build the atlas with:
+
+    python -m arcade-pointandclick.atlas
+
+Every small image under resources/img (character frames, cursors, icons, UI)
+is packed into one or a few sheets under resources/atlas, next to a
+manifest of where each image (and, for character frames, its mirror image)
+landed. At runtime TextureAtlas opens each sheet once and cuts textures out
+of it, instead of decoding one PNG per texture and decoding it again for
+the mirrored copy. Anything missing from the atlas, or changed since it was
+built, is loaded from the loose file as before.
+
+The atlas saves decodes, not texture binds: each image still becomes its
+own arcade.Texture, and arcade 2.3 already combines the textures of a
+SpriteList into one for drawing.
+"""
+# Standard Library
+import argparse
+from fnmatch import fnmatch
+import hashlib
+import json
+import os
+from pathlib import Path
+
+# Third Party
+import PIL.Image
+import PIL.ImageOps
+import arcade
+
+MANIFEST_NAME = "atlas.json"
+MANIFEST_VERSION = 1
+
+SHEET_SIZE = 2048
+PADDING = 1
+
+# Images bigger than this in either direction (room backgrounds) stay loose
+MAX_PACKED_SIZE = 512
+
+# Images whose mirror image is packed too, for left/right facing sprites
+MIRRORED_PATTERNS = ("[0-9]*.png",)
+
+
+def atlas_sources(img_dir):
+    '''
+    Relative paths of every image under img_dir small enough to pack.
+    '''
+    img_dir = Path(img_dir)
+    for filename in sorted(img_dir.glob("**/*.png")):
+        with PIL.Image.open(filename) as image:
+            width, height = image.size
+        if width <= MAX_PACKED_SIZE and height <= MAX_PACKED_SIZE:
+            yield filename.relative_to(img_dir).as_posix()
+
+
+def pack_shelves(sizes, sheet_size=SHEET_SIZE, padding=PADDING):
+    '''
+    Shelf-pack (key, width, height) boxes, tallest first.
+
+    Returns {key: (sheet, x, y)} and the number of sheets used.
+    '''
+    placements = {}
+    sheet, x, y, shelf_height = 0, 0, 0, 0
+
+    for key, width, height in sorted(sizes, key=lambda box: -box[2]):
+        if width > sheet_size or height > sheet_size:
+            raise ValueError(f"{key} does not fit in a {sheet_size}px sheet")
+
+        if x + width > sheet_size:
+            x, y = 0, y + shelf_height + padding
+            shelf_height = 0
+        if y + height > sheet_size:
+            sheet, x, y, shelf_height = sheet + 1, 0, 0, 0
+
+        placements[key] = (sheet, x, y)
+        x += width + padding
+        shelf_height = max(shelf_height, height)
+
+    return placements, (sheet + 1 if placements else 0)
+
+
+def build_atlas(img_dir, atlas_dir, sheet_size=SHEET_SIZE):
+    '''
+    Pack the images under img_dir into sheets and write them, plus the
+    manifest, to atlas_dir. Returns the manifest.
+    '''
+    img_dir, atlas_dir = Path(img_dir), Path(atlas_dir)
+    atlas_dir.mkdir(parents=True, exist_ok=True)
+
+    images = {}
+    sources = {}
+    for name in atlas_sources(img_dir):
+        source = img_dir / name
+        source_bytes = source.read_bytes()
+        image = PIL.Image.open(source).convert("RGBA")
+        stat = source.stat()
+        sources[name] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            # Lets the hit-box cache skip re-reading the source file
+            "sha1": hashlib.sha1(source_bytes).hexdigest(),
+        }
+
+        images[(name, False)] = image
+        if any(fnmatch(name, pattern) for pattern in MIRRORED_PATTERNS):
+            images[(name, True)] = PIL.ImageOps.mirror(image)
+
+    placements, sheet_count = pack_shelves(
+        [(key, image.width, image.height) for key, image in images.items()],
+        sheet_size)
+
+    # Trim each sheet to the area actually used
+    extents = [(0, 0)] * sheet_count
+    for key, (sheet, x, y) in placements.items():
+        image = images[key]
+        extents[sheet] = (max(extents[sheet][0], x + image.width),
+                          max(extents[sheet][1], y + image.height))
+    sheets = [PIL.Image.new("RGBA", extent) for extent in extents]
+
+    entries = {}
+    for (name, mirrored), (sheet, x, y) in placements.items():
+        image = images[(name, mirrored)]
+        sheets[sheet].paste(image, (x, y))
+
+        entry = entries.setdefault(name, dict(sources[name]))
+        entry["mirrored" if mirrored else "normal"] = {
+            "sheet": sheet,
+            "rect": [x, y, image.width, image.height],
+        }
+
+    sheet_names = []
+    for index, sheet in enumerate(sheets):
+        sheet_name = f"sheet{index}.png"
+        sheet.save(atlas_dir / sheet_name)
+        sheet_names.append(sheet_name)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "sheets": sheet_names,
+        "images": entries,
+    }
+    with open(atlas_dir / MANIFEST_NAME, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+
+    return manifest
+
+
+class TextureAtlas():
+    '''
+    Hands out arcade Textures cut from the packed sheets.
+
+    Images in an up-to-date asset pack (see pack.py) come from there
+    instead. Falls back to the loose file for images that are in neither,
+    or whose source file has changed since they were built. Hit boxes come
+    from hit_boxes, a HitBoxCache, rather than a fresh pixel scan.
+    '''
+    def __init__(self, img_dir, atlas_dir, hit_boxes, pack=None):
+        self.img_dir = Path(img_dir)
+        self.atlas_dir = Path(atlas_dir)
+        self.hit_boxes = hit_boxes
+        # An AssetPack, tried before the sheets
+        self.pack = pack
+
+        self.manifest = None
+        self.sheets = {}
+        self.textures = {}
+        # Loose images decoded ahead of time (see preload.py)
+        self.decoded = {}
+
+    def _load_manifest(self):
+        self.manifest = {"images": {}, "sheets": []}
+        try:
+            with open(self.atlas_dir / MANIFEST_NAME) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return
+        if manifest.get("version") == MANIFEST_VERSION:
+            self.manifest = manifest
+
+    def decode_sheet(self, index):
+        """ Decode sheet index. Only touches PIL, so any thread may. """
+        sheet_name = self.manifest["sheets"][index]
+        return PIL.Image.open(self.atlas_dir / sheet_name).convert("RGBA")
+
+    def install_sheet(self, index, image):
+        self.sheets.setdefault(index, image)
+
+    def _sheet(self, index):
+        if index not in self.sheets:
+            self.sheets[index] = self.decode_sheet(index)
+        return self.sheets[index]
+
+    def _entry(self, name):
+        entry = self.manifest["images"].get(name)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(self.img_dir / name)
+        except OSError:
+            return entry
+        if stat.st_mtime != entry["mtime"] or stat.st_size != entry["size"]:
+            return None
+        return entry
+
+    def sheet_indices(self, filename, mirrored=False):
+        """
+        The sheets filename (and its packed mirror image) come from, or []
+        if it will be loaded from the asset pack or the loose file.
+        """
+        if self.pack is not None and self.pack.entry(filename) is not None:
+            return []
+        if self.manifest is None:
+            self._load_manifest()
+        name = self._relative_name(filename)
+        entry = self._entry(name) if name is not None else None
+        if entry is None:
+            return []
+        rects = [entry["normal"]]
+        if mirrored and "mirrored" in entry:
+            rects.append(entry["mirrored"])
+        return sorted({rect["sheet"] for rect in rects})
+
+    def preload(self, filename, image, content_hash=None):
+        """ Use an already decoded image for a loose file. """
+        self.decoded[str(filename)] = (image, content_hash)
+
+    def _relative_name(self, filename):
+        try:
+            return Path(filename).relative_to(self.img_dir).as_posix()
+        except ValueError:
+            return None
+
+    def texture(self, filename, mirrored=False):
+        """
+        The texture for an image file, optionally mirrored left to right.
+        """
+        key = (str(filename), mirrored)
+        if key in self.textures:
+            return self.textures[key]
+
+        if self.manifest is None:
+            self._load_manifest()
+
+        # Already decoded in the asset pack, mirror image and all
+        packed = None
+        if self.pack is not None:
+            packed = self.pack.lookup(filename, mirrored)
+
+        name = self._relative_name(filename)
+        entry = None
+        if packed is None and name is not None:
+            entry = self._entry(name)
+
+        mirrored_copy = None
+        if packed is not None:
+            image, content_hash = packed
+            if mirrored:
+                mirrored_copy = image
+        elif entry is None:
+            image, content_hash = self.decoded.get(str(filename),
+                                                   (None, None))
+            if image is None:
+                image = PIL.Image.open(filename).convert("RGBA")
+        else:
+            if mirrored:
+                mirrored_copy = entry.get("mirrored")
+            rect = mirrored_copy or entry["normal"]
+            x, y, width, height = rect["rect"]
+            image = self._sheet(rect["sheet"]).crop(
+                (x, y, x + width, y + height))
+            content_hash = entry.get("sha1")
+
+        # Hit boxes are cached for the unmirrored image
+        hit_box = self.hit_boxes.points(
+            filename, None if mirrored_copy else image, mirrored,
+            content_hash)
+
+        if mirrored and mirrored_copy is None:
+            # Mirror image was not packed; flip it in memory
+            image = PIL.ImageOps.mirror(image)
+
+        texture = arcade.Texture(f"{filename}{mirrored}", image)
+        texture.hit_box_points = hit_box
+        # Lets mirror-image pairs share one alpha mask (see masks.py)
+        texture.mask_key = (str(filename), mirrored)
+
+        self.textures[key] = texture
+        return texture
+
+    def texture_pair(self, filename):
+        """ The texture and its mirror image, for left/right facing. """
+        return [self.texture(filename), self.texture(filename, mirrored=True)]
+
+
+def main():
+    """ Build the atlas for the game's resources. """
+    project = Path(os.path.dirname(__file__))
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--img", default=project / "resources" / "img",
+                        type=Path, help="image directory to pack")
+    parser.add_argument("--out", default=project / "resources" / "atlas",
+                        type=Path, help="where to write sheets and manifest")
+    parser.add_argument("--sheet-size", default=SHEET_SIZE, type=int)
+    args = parser.parse_args()
+
+    manifest = build_atlas(args.img, args.out, args.sheet_size)
+    print(f"Packed {len(manifest['images'])} images into "
+          f"{len(manifest['sheets'])} sheet(s) in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
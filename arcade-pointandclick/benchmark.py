@@ -0,0 +1,187 @@
+"""
+Micro-benchmarks for the headless game core.
+
+Times the per-frame update, hover queries, clicks and inventory paging
+with 10 to 10 000 extra items in the start room, and the update with as
+many characters walking about. No window or GL context is opened, so this
+runs on a plain CI box:
+
+    python -m arcade-pointandclick.benchmark
+    python -m arcade-pointandclick.benchmark --items 100 1000 --json out.json
+
+Numbers are microseconds per call.
+"""
+# Standard Library
+import argparse
+import json
+import random
+from statistics import mean, median
+import time
+
+# Third Party
+import arcade
+
+# Local
+from .core import CURSOR_MOVE, GameCore, Item, Player, path
+
+ITEM_COUNTS = (10, 100, 1000, 10000)
+
+# Calls timed per benchmark
+REPEAT = 500
+
+# Images the extra items are drawn from
+ITEM_IMAGES = ("book.png", "key.png", "potion.png", "ring.png", "sword.png")
+
+
+def populate(core, count, rng):
+    '''
+    Scatter count pick-up-able items over the current room.
+    '''
+    room = core.room
+    for index in range(count):
+        image = rng.choice(ITEM_IMAGES)
+        room.items.append(Item(
+            path['img'] / image, 1, f"{image[:-4]} {index}", "",
+            [rng.randint(0, 800), rng.randint(150, 600)], True,
+            room.number, IN_INVENTORY=False, Z_INDEX=0))
+
+    # Rebuild the world layer around the new items
+    core.change_room(room, core.player_sprite.position)
+    core.update(0)
+
+
+def random_point(rng):
+    return rng.uniform(0, 800), rng.uniform(0, 600)
+
+
+def walkable_point(core, rng):
+    navmesh = core.room.navmesh
+    while True:
+        x, y = random_point(rng)
+        if navmesh.contains(x, y):
+            return x, y
+
+
+def timed(function, repeat=REPEAT):
+    """ Seconds taken by each of repeat calls to function(index). """
+    times = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        function(index)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_update(core, rng):
+    player = core.player_sprite
+    targets = [walkable_point(core, rng) for _ in range(16)]
+
+    def frame(index):
+        # Keep the player walking so the world actually changes
+        if not player.path:
+            player.walk_to(core.room.navmesh.find_path(
+                (player.center_x, player.bottom), targets[index % 16]) or [])
+        core.update(1 / 60)
+
+    return timed(frame)
+
+
+def bench_hover(core, rng):
+    points = [random_point(rng) for _ in range(REPEAT)]
+    return timed(lambda index: core.sprite_at(*points[index]))
+
+
+def bench_click(core, rng):
+    points = [random_point(rng) for _ in range(REPEAT)]
+
+    def click(index):
+        core.cursor_mode = CURSOR_MOVE
+        core.click(*points[index], arcade.MOUSE_BUTTON_LEFT)
+
+    return timed(click)
+
+
+def bench_inventory(core, rng):
+    inventory = core.inventory
+    for item in core.room.items:
+        inventory.add(item)
+        item.IN_INVENTORY = True
+    # Take them all out of the world at once
+    core.change_room(core.room, core.player_sprite.position)
+
+    def page(index):
+        inventory.arrow('down' if index % 2 else 'up')
+
+    return timed(page)
+
+
+def bench_walkers(core, rng):
+    # One walker per item, each pacing between random walkable points
+    for _ in range(len(core.room.items)):
+        walker = Player(core.actors)
+        walker.set_position(*walkable_point(core, rng))
+        core.level_sprites.append(walker)
+        walker.walk_to([walkable_point(core, rng) for _ in range(32)])
+    core.update(0)
+
+    return timed(lambda index: core.update(1 / 60))
+
+
+BENCHMARKS = (
+    ("update", bench_update),
+    ("hover", bench_hover),
+    ("click", bench_click),
+    ("inventory", bench_inventory),
+    ("walkers", bench_walkers),
+)
+
+
+def run(counts=ITEM_COUNTS, seed=0):
+    '''
+    Run every benchmark at every item count. Returns
+    {benchmark: {count: {"mean": us, "median": us, "max": us}}}.
+    '''
+    results = {name: {} for name, _ in BENCHMARKS}
+    for count in counts:
+        for name, benchmark in BENCHMARKS:
+            # A fresh core per benchmark, so one can't warm up the next
+            rng = random.Random(seed)
+            core = GameCore(seed=seed)
+            core.setup()
+            populate(core, count, rng)
+
+            times = benchmark(core, rng)
+
+            results[name][count] = {
+                "mean": mean(times) * 1e6,
+                "median": median(times) * 1e6,
+                "max": max(times) * 1e6,
+            }
+    return results
+
+
+def main():
+    """ Run the benchmarks and print a table. """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--items", nargs="+", type=int, default=ITEM_COUNTS,
+                        help="item counts to benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    results = run(args.items, args.seed)
+
+    print(f"{'benchmark':<12}{'items':>8}{'mean':>12}{'median':>12}"
+          f"{'max':>12}")
+    for name, by_count in results.items():
+        for count, stats in by_count.items():
+            print(f"{name:<12}{count:>8}{stats['mean']:>12.1f}"
+                  f"{stats['median']:>12.1f}{stats['max']:>12.1f}")
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
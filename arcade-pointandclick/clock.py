@@ -0,0 +1,90 @@
+"""
+Fixed-timestep simulation clock.
+
+The world used to be stepped by whatever delta_time the window handed
+on_update, so walking speed, animation rate and arrival checks all drifted
+with the frame rate. FixedStepClock turns real time into a whole number of
+equal simulation steps, keeping the remainder for next frame, and
+Interpolator draws moving sprites part way between their last two
+simulated positions so motion stays smooth when the display runs faster
+or slower than the simulation.
+"""
+
+SIMULATION_RATE = 60
+
+# Steps allowed per frame before the clock gives up catching up, so a long
+# stall (dragging the window, a breakpoint) can't spiral into ever longer
+# frames
+MAX_CATCH_UP_STEPS = 5
+
+
+class FixedStepClock():
+    '''
+    Accumulates real time and hands it back in fixed steps.
+    '''
+    def __init__(self, rate=SIMULATION_RATE, max_steps=MAX_CATCH_UP_STEPS):
+        self.step = 1 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+
+        self.steps = 0
+        self.dropped_time = 0.0
+
+    def advance(self, delta_time):
+        """ Number of fixed steps to simulate for delta_time seconds. """
+        self.accumulator += delta_time
+
+        steps = int(self.accumulator / self.step)
+        if steps > self.max_steps:
+            # Drop whole steps we won't catch up on, keep the fraction
+            dropped = steps - self.max_steps
+            self.dropped_time += dropped * self.step
+            self.accumulator -= dropped * self.step
+            steps = self.max_steps
+
+        self.accumulator -= steps * self.step
+        self.steps += steps
+        return steps
+
+    @property
+    def alpha(self):
+        """ How far the display is between the last step and the next. """
+        return min(max(self.accumulator / self.step, 0.0), 1.0)
+
+
+class Interpolator():
+    '''
+    Remembers where sprites were before the latest simulation step and
+    moves them part way back for drawing.
+    '''
+    def __init__(self):
+        self.previous = {}
+        self.current = {}
+
+    def snapshot(self, sprites):
+        """ Call before each simulation step. """
+        self.previous = {sprite: sprite.position for sprite in sprites}
+
+    def apply(self, alpha):
+        """
+        Move sprites to their interpolated positions. restore() puts them
+        back once drawing is done.
+        """
+        self.current = {}
+        for sprite, (previous_x, previous_y) in self.previous.items():
+            x, y = sprite.position
+            if x == previous_x and y == previous_y:
+                continue
+            self.current[sprite] = (x, y)
+            sprite.set_position(previous_x + (x - previous_x) * alpha,
+                                previous_y + (y - previous_y) * alpha)
+
+    def restore(self):
+        for sprite, position in self.current.items():
+            sprite.set_position(*position)
+        self.current = {}
+
+    def forget(self):
+        """ Drop the history, e.g. when sprites jump between rooms. """
+        self.previous = {}
+        self.current = {}
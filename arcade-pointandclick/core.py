@@ -0,0 +1,1003 @@
+"""
+Headless game core.
+
+Everything the game knows and decides (the player, items, inventory, rooms,
+hit-testing, movement, pickup and room changes) lives here, built only on
+sprites and sprite lists, which never touch OpenGL until they are drawn.
+MyGame in __main__ is a thin window around a GameCore: it forwards input,
+ticks it from on_update and draws what it holds. Benchmarks and scripted
+runs drive a GameCore directly, with no window at all.
+"""
+# Standard Library
+from collections import Counter
+from functools import partial
+from math import sqrt
+import os
+from pathlib import Path
+import random
+
+# Third Party
+import arcade
+
+# Local
+from .actors import LEFT_FACING, RIGHT_FACING, ActorPool
+from .animation import AnimationLibrary, Animator
+from .atlas import TextureAtlas
+from .clock import FixedStepClock, Interpolator
+from .eventlog import DEBUG as LOG_DEBUG, INFO, WARNING, EventLog
+from .hitboxes import HitBoxCache
+from .interactions import COMBINE, EXAMINE, USE, InteractionEngine
+from .layers import WorldLayer
+from .navmesh import NavMesh
+from .pack import AssetPack
+from .profiler import Profiler
+from .rooms import RoomCache
+from .saves import SaveError, SaveGames
+from .scene import load_scene
+from .spatial import IndexedSpriteList
+
+MOVEMENT_SPEED = 300
+
+SPRITE_SCALING = 3
+
+# Inventory slot grid drawn in the HUD
+INVENTORY_COLUMNS = 8
+INVENTORY_ROWS = 2
+
+# How long examine/pickup messages stay on screen
+MESSAGE_SECONDS = 3
+
+# How close the player has to be to pick something up
+PICKUP_DISTANCE = 200
+
+# Nobody's feet go below the top of the HUD
+WALK_FLOOR = 150
+
+# What a click does; also the index of the matching cursor texture
+CURSOR_MOVE = 0
+CURSOR_EXAMINE = 1
+CURSOR_USE = 2
+
+# Quick save and load
+SAVE_KEY = arcade.key.F5
+LOAD_KEY = arcade.key.F9
+
+DEBUG = False
+# DEBUG = True
+
+# File paths for project and resources
+path = {}
+path['project'] = Path(os.path.dirname(__file__))
+path['resources'] = path['project'] / "resources"
+path['img'] = path['resources'] / "img"
+path['atlas'] = path['resources'] / "atlas"
+path['scenes'] = path['resources'] / "scenes"
+path['animations'] = path['resources'] / "animations.json"
+path['preload'] = path['resources'] / "preload.json"
+path['hitboxes'] = path['resources'] / "hitboxes.json"
+path['rules'] = path['resources'] / "rules.json"
+path['saves'] = path['project'] / "saves"
+path['profiles'] = path['project'] / "profiles"
+path['pack'] = path['resources'] / "assets.pack"
+
+# Every image pre-decoded, built with `pipenv run pack`; optional
+assets = AssetPack(path['pack'], path['img'])
+
+# Hit boxes computed on earlier runs, keyed by image content
+hit_boxes = HitBoxCache(path['hitboxes'])
+
+# Packed sprite sheets, built with `pipenv run atlas`
+textures = TextureAtlas(path['img'], path['atlas'], hit_boxes, pack=assets)
+
+# Animation clips, each loaded once and shared by every sprite playing it
+animations = AnimationLibrary(path['animations'], path['img'], textures)
+
+# Frame-phase timings; off (and close to free) until the overlay is opened
+profiler = Profiler()
+
+# Structured event log; every category is off until log.open()
+log = EventLog()
+game_log = log.category("game")
+inventory_log = log.category("inventory")
+room_log = log.category("room")
+save_log = log.category("save")
+startup_log = log.category("startup")
+render_log = log.category("render")
+
+
+def atlas_sprite(filename, scale=1, **kwargs):
+    '''
+    Sprite whose texture comes from the atlas rather than its own file.
+    '''
+    sprite = arcade.Sprite(scale=scale, **kwargs)
+    sprite.texture = textures.texture(filename)
+    sprite.textures = [sprite.texture]
+    return sprite
+
+
+class Player(arcade.Sprite):
+    '''
+    Player Class
+    '''
+
+    def __init__(self, actors):
+        # Set up parent class
+        super().__init__()
+
+        self.name = 'Player'
+
+        # Moves the player (and anyone else walking) each step
+        self.actors = actors
+
+        self.goto_x = 0
+        self.goto_y = 0
+
+        # Waypoints still to walk, feet positions from the room's navmesh
+        self.path = []
+
+        # Default to face-right
+        self.character_face_direction = RIGHT_FACING
+
+        self.scale = SPRITE_SCALING
+
+        self.Z_INDEX = 0
+
+        # --- Load Textures ---
+        # Images from Kenney.nl's Asset Pack 3
+        # kenney_path = ":resources:images/animated_characters/"
+        # main_path = f"{kenney_path}female_adventurer/femaleAdventurer"
+        # main_path = f"{kenney_path}female_person/femalePerson"
+        # main_path = f"{kenney_path}male_person/malePerson"
+        # main_path = f"{kenney_path}male_adventurer/maleAdventurer"
+        # main_path = f"{kenney_path}zombie/zombie"
+        # main_path = f"{kenney_path}robot/robot"
+
+        # Idle and walk cycles are clips in resources/animations.json
+        self.animator = Animator(animations.clip("player.idle"))
+
+        # Set the initial texture
+        self.texture = self.animator.texture(self.character_face_direction)
+
+        # Hit box will be set based on the first image used.
+        # If you want to specify
+        # a different hit box, you can do it like the code below.
+        # self.set_hit_box([[-22, -64], [22, -64], [22, 28], [-22, 28]])
+        # self.set_hit_box(self.texture.hit_box_points)
+
+    def update_animation(self, delta_time):
+        # Figure out if we need to flip face left or right
+        if self.change_x < 0 and self.character_face_direction == RIGHT_FACING:
+            self.character_face_direction = LEFT_FACING
+
+        elif (
+                self.change_x > 0 and
+                self.character_face_direction == LEFT_FACING
+             ):
+            self.character_face_direction = RIGHT_FACING
+
+        if self.change_x == 0 and self.change_y == 0:
+            self.animator.play(animations.clip("player.idle"))
+        else:
+            self.animator.play(animations.clip("player.walk"))
+
+        self.animator.update(delta_time)
+        self.texture = self.animator.texture(self.character_face_direction)
+
+    def walk_to(self, path):
+        """ Start walking through a list of (x, y) feet positions. """
+        path = list(path)
+        self.goto_x, self.goto_y = path[-1] if path else (0, 0)
+        self.actors.walk(self, path, MOVEMENT_SPEED)
+
+    def stop(self):
+        self.actors.stop(self)
+
+    def draw(self, **kwargs):
+        """ Draw the sprite. """
+
+        if self._sprite_list is None:
+            from arcade import SpriteList
+            self._sprite_list = SpriteList()
+            self._sprite_list.append(self)
+
+        self._sprite_list.draw(**kwargs)
+
+
+class Item(arcade.Sprite):
+    '''
+    Item Class
+    '''
+    def __init__(self, filename, scale,
+                 name, description,
+                 set_position,
+                 CAN_BE_PICKED_UP,
+                 level, **kwargs):
+
+        super().__init__(scale=scale)
+        self.texture = textures.texture(filename)
+        self.textures = [self.texture]
+        self.name = name
+        self.description = description
+        self.center_x, self.center_y = set_position
+        self.CAN_BE_PICKED_UP = CAN_BE_PICKED_UP
+        self.IN_INVENTORY = kwargs.get('IN_INVENTORY', None)
+        # Used up by an interaction, so neither in the world nor carried
+        self.removed = False
+        # Where it was picked up from, while in the inventory
+        self.world_position = None
+        self.Z_INDEX = 1
+        self.Z_INDEX = kwargs.get('Z_INDEX', None)
+        self.level = level
+
+        # Precomputed by the scene compiler, saves scanning the texture
+        if kwargs.get('hit_box') is not None:
+            self.set_hit_box(kwargs['hit_box'])
+
+    def examine(self):
+        return self.description
+
+    def use(self):
+        pass
+
+    def draw(self, **kwargs):
+        """ Draw the sprite. """
+
+        if self._sprite_list is None:
+            from arcade import SpriteList
+            self._sprite_list = SpriteList()
+            self._sprite_list.append(self)
+
+        self._sprite_list.draw(**kwargs)
+
+
+class Inventory(IndexedSpriteList):
+    '''
+    Inventory Class
+
+    Items live in slots, in the order they were picked up. Only the page
+    of rows on screen is in the sprite list itself, so drawing, hit-testing
+    and paging cost the same whether the player carries ten items or ten
+    thousand. Removing an item leaves an empty slot; slots are compacted
+    once at least half of them are empty.
+    '''
+    def __init__(self, columns=INVENTORY_COLUMNS, rows=INVENTORY_ROWS,
+                 slot_pitch=80, margin=50):
+        super().__init__()
+
+        self.columns = columns
+        self.rows = rows
+        self.slot_pitch = slot_pitch
+        self.margin = margin
+
+        self.slots = []
+        self.slot_of = {}
+        self.empty_slots = 0
+        # How many of each item name are carried, for interaction rules
+        self.carried = Counter()
+
+        self.row_index = 0
+
+    @property
+    def items(self):
+        return [item for item in self.slots if item is not None]
+
+    @property
+    def page_size(self):
+        return self.columns * self.rows
+
+    @property
+    def total_rows(self):
+        return -(-len(self.slots) // self.columns)
+
+    def page_slots(self):
+        first = self.row_index * self.columns
+        return range(first, min(first + self.page_size, len(self.slots)))
+
+    def slot_center(self, slot):
+        """ Screen position of a slot on the current page. """
+        row, column = divmod(slot - self.row_index * self.columns,
+                             self.columns)
+        # Row 0 of the page is the top row of the panel
+        return (column * self.slot_pitch + self.margin,
+                (self.rows - 1 - row) * self.slot_pitch + self.margin)
+
+    def add(self, item):
+        slot = len(self.slots)
+        self.slots.append(item)
+        self.slot_of[item] = slot
+        self.carried[item.name] += 1
+        if slot in self.page_slots():
+            self._show(item, slot)
+
+    def remove(self, item):
+        slot = self.slot_of.pop(item)
+        self.slots[slot] = None
+        self.empty_slots += 1
+        self.carried[item.name] -= 1
+        if not self.carried[item.name]:
+            del self.carried[item.name]
+        if item in self.sprite_idx:
+            super().remove(item)
+
+        if self.empty_slots * 2 >= len(self.slots):
+            self._compact()
+
+    def _show(self, item, slot):
+        item.center_x, item.center_y = self.slot_center(slot)
+        self.append(item)
+
+    def _compact(self):
+        self.slots = self.items
+        self.slot_of = {item: slot for slot, item in enumerate(self.slots)}
+        self.empty_slots = 0
+        self.row_index = min(self.row_index,
+                             max(0, self.total_rows - self.rows))
+        self.update()
+
+    def update(self):
+        """ Rebuild the visible page. Touches only the page's items. """
+        self.clear()
+
+        for slot in self.page_slots():
+            item = self.slots[slot]
+            if item is not None:
+                self._show(item, slot)
+
+    def restore(self, items, row_index=0):
+        """ Replace the contents, e.g. from a save game. """
+        self.slots = list(items)
+        self.slot_of = {item: slot for slot, item in enumerate(self.slots)}
+        self.empty_slots = 0
+        self.carried = Counter(item.name for item in self.slots)
+        self.row_index = max(0, min(row_index, self.total_rows - self.rows))
+        self.update()
+
+    def arrow(self, direction):
+        if direction == 'up' and self.row_index > 0:
+            self.row_index -= 1
+        elif (direction == 'down' and
+                self.row_index < self.total_rows - self.rows):
+            self.row_index += 1
+        else:
+            return
+        if inventory_log.debug:
+            inventory_log.event(LOG_DEBUG, "page", direction=direction,
+                                row=self.row_index)
+        self.update()
+
+
+class Room():
+    '''
+    Room Class
+    '''
+    def __init__(self, name, number, filename, scale, item_factory=None):
+        self.name = name
+        self.number = number
+        self.items = arcade.SpriteList()
+        self.navmesh = None
+        self.transitions = []
+        self.player_scale = SPRITE_SCALING
+
+        # Nothing is decoded until the room is loaded (see RoomCache)
+        self.filename = filename
+        self.scale = scale
+        self.item_factory = item_factory
+        self.item_images = []
+        self.items_loaded = False
+        self.background = None
+
+        self.room_dict = {
+            'transition_location': (0, 0),
+            'move_to_room': None,
+            'player_position': (0, 0),
+        },
+
+        self.connected_rooms = []
+
+    @property
+    def loaded(self):
+        return self.background is not None
+
+    @property
+    def texture_bytes(self):
+        if self.background is None:
+            return 0
+        texture = self.background.texture
+        return texture.width * texture.height * 4
+
+    def decode(self):
+        """
+        Decode the background image. Only touches PIL, so it is safe to run
+        on a worker thread.
+        """
+        image = assets.image(self.filename)
+        texture = arcade.Texture(str(self.filename), image)
+
+        # The background is never hit-tested, so skip scanning its pixels
+        half_width, half_height = image.width / 2, image.height / 2
+        texture.hit_box_points = [
+            [-half_width, -half_height], [half_width, -half_height],
+            [half_width, half_height], [-half_width, half_height]]
+        return texture
+
+    def load(self, texture=None):
+        """
+        Build the background sprite, from an already decoded texture if
+        given. Items are left to load_items, see RoomCache.enter.
+        """
+        if texture is None:
+            texture = self.decode()
+
+        self.background = arcade.Sprite(scale=self.scale)
+        self.background.texture = texture
+        self.background.bottom = 150
+        self.background.left = 0
+
+    def load_items(self):
+        """ Create the room's items, the first time only. """
+        # Items carry game state, so they outlive the background
+        if not self.items_loaded and self.item_factory is not None:
+            self.items.extend(self.item_factory())
+        self.items_loaded = True
+
+    def unload(self):
+        self.background = None
+
+    @classmethod
+    def from_spec(cls, spec, rng=random):
+        '''
+        Build a room from a compiled scene RoomSpec. Its items are created
+        when the room first loads, placed with rng.
+        '''
+        room = cls(spec.name, spec.number, path['img'] / spec.background,
+                   spec.scale, item_factory=partial(make_items, spec, rng))
+        room.navmesh = NavMesh(spec.navmesh)
+        # What load_items will need, so it can be decoded ahead of time
+        room.item_images = [path['img'] / item.image for item in spec.items]
+        room.transitions = spec.transitions
+        room.player_scale = spec.player_scale
+        return room
+
+    def transition_at(self, x, y):
+        for transition in self.transitions:
+            left, bottom, right, top = transition.area
+            if left < x < right and bottom < y < top:
+                return transition
+        return None
+
+    def move_to_room(self):
+        pass
+
+
+def make_items(room_spec, rng=random):
+    '''
+    Create the Items a compiled room places.
+    '''
+    items = []
+    for index, spec in enumerate(room_spec.items):
+        if spec.random_position:
+            (x_min, x_max), (y_min, y_max) = spec.random_position
+            position = [rng.randint(x_min, x_max),
+                        rng.randint(y_min, y_max)]
+        else:
+            position = list(spec.position)
+
+        item = Item(
+            path['img'] / spec.image, spec.scale, spec.name,
+            spec.description, position, spec.can_be_picked_up,
+            room_spec.number, IN_INVENTORY=False, Z_INDEX=spec.z_index,
+            hit_box=spec.hit_box)
+        # Stable across runs, since the scene file fixes the order
+        item.save_id = (room_spec.number, index)
+        items.append(item)
+    return items
+
+
+class GameCore():
+    '''
+    Game state and rules, with no window or GL context.
+
+    cursor_mode says what the next click does (CURSOR_MOVE, CURSOR_EXAMINE
+    or CURSOR_USE), and message is the line of text to show, if any.
+    held is the carried item picked to use on the next thing clicked.
+
+    What examining and using items does comes from the interaction rules
+    (see interactions.py). Clicks queue effects, and housekeeping applies
+    them at the end of the tick.
+
+    With a seed, random item placement is the same on every run. Each room
+    gets its own generator, since rooms create their items whenever they
+    first load.
+
+    dirty is set whenever something the window draws may have changed;
+    the window clears it once it has drawn the change.
+    '''
+    def __init__(self, scene_path=None, seed=None):
+        self.seed = seed
+
+        # Depth-sorted world layer, also used for mouse hit-testing
+        self.level_sprites = None
+        self.player_sprite = None
+
+        # Everyone walking, moved together each step
+        self.actors = ActorPool(floor=WALK_FLOOR)
+
+        self.inventory = Inventory()
+
+        self.inventory_arrows = None
+
+        self.cursor_mode = CURSOR_MOVE
+        self.held = None
+
+        self.interactions = InteractionEngine(path['rules'])
+        # Item name -> items, across the rooms that have created theirs
+        self.items_by_name = {}
+        self.indexed_rooms = set()
+
+        self.message = ""
+        self.message_timer = 0
+
+        self.dirty = True
+        # Whether anyone walked last step; their final position is drawn
+        # the step after they stop
+        self.was_moving = False
+
+        self.room_cache = RoomCache()
+
+        # The world is simulated in fixed steps, whatever the frame rate
+        self.clock = FixedStepClock()
+        self.interpolator = Interpolator()
+
+        '''
+        ROOMS
+        '''
+        if scene_path is None:
+            scene_path = path['scenes'] / 'scene.json'
+        scene = load_scene(scene_path, path['img'], hit_boxes=hit_boxes)
+
+        self.rooms = [Room.from_spec(spec, self.room_rng(spec.number))
+                      for spec in scene]
+        rooms_by_number = {room.number: room for room in self.rooms}
+
+        for room, spec in zip(self.rooms, scene):
+            room.connected_rooms = [
+                rooms_by_number[number] for number in spec.connected]
+
+        self.rooms_by_number = rooms_by_number
+
+        self.room = self.rooms[0]
+
+        self.save_dir = path['saves']
+        self.saves = SaveGames(self, self.save_dir / 'autosave.sav')
+
+    def room_rng(self, number):
+        """ The generator a room places its items with. """
+        if self.seed is None:
+            return random
+        return random.Random(self.seed * 1000003 + number)
+
+    def setup(self):
+        # Sprite lists
+        self.level_sprites = WorldLayer()
+
+        # Set up the player
+        self.player_sprite = Player(self.actors)
+
+        # Loads the first room (and its items) and prefetches its neighbours
+        self.change_room(self.room, (50, 300))
+
+        # rand_items = (
+        #     ('book', "It's a book.",
+        #         path['img'] / "book.png", 1),
+        #     ('key', "It's a key. It opens stuff.",
+        #         path['img'] / "key.png", 1),
+        #     ('firearm', "It's a gun. You should probably run.",
+        #         path['img'] / "firearm.png", 2.5),
+        #     ('brick', "It's a block of cocaine. Nifty.",
+        #         path['img'] / "brick.png", 2.5),
+        #     ("Hammer", "It's hammer time.",
+        #         path['img'] / "hammer.png", 2.5),
+        #     ('sword', "It's a sword.",
+        #         path['img'] / "sword.png", 1),
+        # )
+
+        # for i in range(20):
+        #     item = random.choice(rand_items)
+        #     self.level_sprites.append(
+        #         Item(
+        #             item[2], item[3], item[0], item[1],
+        #             [random.randint(0, 800), random.randint(200, 600)],
+        #             True, 0, IN_INVENTORY=False, Z_INDEX=0))
+
+        self.inventory_arrows = arcade.SpriteList()
+
+        self.inventory_arrows.append(
+            atlas_sprite(
+                path['img'] / 'ui/arrow_up.png', 4,
+                center_x=725, center_y=125))
+
+        self.inventory_arrows.append(
+            atlas_sprite(
+                path['img'] / 'ui/arrow_down.png', 4,
+                center_x=725, center_y=50))
+
+    def change_room(self, room, player_position):
+        """
+        Move the player into room, rebuilding the world layer around it.
+        """
+        if room_log.info:
+            room_log.event(INFO, "enter", tick=self.clock.steps,
+                           room=room.number, room_name=room.name,
+                           previous=self.room.number,
+                           x=player_position[0], y=player_position[1])
+
+        self.room = room
+        self.room_cache.enter(room)
+
+        self.player_sprite.set_position(*player_position)
+        # self.player_sprite.goto_x,
+        # self.player_sprite.goto_y = self.player_sprite._get_position()
+        self.player_sprite.stop()
+        self.player_sprite.scale = room.player_scale
+
+        # Don't draw the player sliding in from the last room
+        self.interpolator.forget()
+        self.dirty = True
+
+        # Carried items are drawn by the inventory, not the world
+        self.level_sprites.clear()
+        self.level_sprites.append(self.player_sprite)
+
+        for item in self.room.items:
+            if not item.IN_INVENTORY and not item.removed:
+                self.level_sprites.append(item)
+
+        # Keep any hit boxes the new room's textures needed for next launch
+        hit_boxes.save()
+
+    def update(self, delta_time):
+        """
+        Advance the game by delta_time seconds of real time.
+        """
+        with profiler.scope("simulate"):
+            for _ in range(self.clock.advance(delta_time)):
+                self.simulate(self.clock.step)
+
+        self.housekeeping(delta_time)
+
+    def step(self):
+        """
+        Advance the game by exactly one fixed step, however long it has
+        really been. Replays run the game this way, as fast as it goes.
+        """
+        with profiler.scope("simulate"):
+            self.simulate(self.clock.step)
+        self.clock.steps += 1
+
+        self.housekeeping(self.clock.step)
+
+    def housekeeping(self, delta_time):
+        """
+        Everything after the simulation steps, once per update.
+        """
+        # self.level_sprites.update()
+
+        # Everything the tick's clicks triggered, in one batch
+        if self.interactions.apply(self):
+            self.dirty = True
+
+        with profiler.scope("depth sort"):
+            self.level_sprites.sort_by_depth()
+
+        # Pick up any rooms the worker finished decoding
+        with profiler.scope("rooms"):
+            self.room_cache.poll()
+
+        if self.message_timer > 0:
+            self.message_timer -= delta_time
+            if self.message_timer <= 0:
+                self.message = ""
+                self.dirty = True
+
+        self.saves.tick(delta_time)
+
+    def simulate(self, step):
+        """
+        Advance the world by one fixed step.
+        """
+        # Walkers are the only sprites that move
+        moving = bool(self.actors.sprites)
+        if moving or self.was_moving:
+            self.dirty = True
+        self.was_moving = moving
+
+        self.interpolator.snapshot(self.actors.sprites)
+        self.actors.update(step)
+
+        texture = self.player_sprite.texture
+        self.player_sprite.update_animation(step)
+        if self.player_sprite.texture is not texture:
+            self.dirty = True
+
+        # TODO Move to on_mouse_release
+        transition = self.room.transition_at(self.player_sprite.center_x,
+                                             self.player_sprite.center_y)
+        if transition is not None:
+            self.change_room(self.rooms_by_number[transition.to],
+                             transition.player_position)
+
+    def show_message(self, text):
+        """
+        Show a line of text at the top of the screen for a few seconds.
+        """
+        self.message = text
+        self.message_timer = MESSAGE_SECONDS
+        self.dirty = True
+
+    def reset_cursor(self):
+        """ Back to the move cursor, holding nothing. """
+        self.cursor_mode = CURSOR_MOVE
+        self.held = None
+        self.dirty = True
+
+    def items_named(self, name):
+        """ Every item called name, in rooms that have created theirs. """
+        for room in self.rooms:
+            if room.items_loaded and room not in self.indexed_rooms:
+                self.indexed_rooms.add(room)
+                for item in room.items:
+                    self.items_by_name.setdefault(item.name, []).append(item)
+        return self.items_by_name.get(name, ())
+
+    def remove_item(self, item):
+        """
+        Take item out of the game, wherever it is. For a name, that is a
+        carried item of that name, or failing that one in this room.
+        """
+        if isinstance(item, str):
+            named = [other for other in self.items_named(item)
+                     if not other.removed]
+            carried = [other for other in named if other.IN_INVENTORY]
+            here = [other for other in named if other in self.room.items]
+            item = (carried or here or [None])[0]
+            if item is None:
+                return
+
+        if item.IN_INVENTORY:
+            self.inventory.remove(item)
+            item.IN_INVENTORY = False
+        elif item in self.level_sprites:
+            self.level_sprites.remove(item)
+        item.removed = True
+        item.world_position = None
+        if item is self.held:
+            self.held = None
+        self.saves.mark_dirty(item)
+
+    def give_item(self, name):
+        """ Put an item called name in the inventory, if there is one. """
+        spare = [item for item in self.items_named(name)
+                 if not item.IN_INVENTORY]
+        if not spare:
+            return
+        item = spare[0]
+        if item in self.level_sprites:
+            self.level_sprites.remove(item)
+        if item.world_position is None:
+            item.world_position = item.position
+        item.removed = False
+        item.IN_INVENTORY = True
+        self.inventory.add(item)
+        self.saves.mark_dirty(item)
+
+    def interact(self, verb, subject, target=None):
+        """
+        Queue the effects of the rule for verb on subject (and target), if
+        there is one. Returns whether there was.
+        """
+        target_name = target.name if target is not None else None
+        rule = self.interactions.resolve(
+            verb, subject.name, target_name, self.inventory.carried,
+            self.room.number)
+        if rule is None:
+            return False
+        if game_log.info:
+            game_log.event(INFO, verb, tick=self.clock.steps,
+                           item=subject.name, target=target_name,
+                           room=self.room.number)
+        self.interactions.queue(rule, subject, target)
+        return True
+
+    def examine(self, sprite):
+        if self.interact(EXAMINE, sprite):
+            return
+        if game_log.info:
+            game_log.event(INFO, "examine", tick=self.clock.steps,
+                           item=sprite.name, room=self.room.number)
+        self.show_message(sprite.examine())
+
+    def use(self, sprite, distance):
+        """
+        Use sprite with the held item, or on its own. With no rule for
+        that, a carried item becomes the held one and anything else is
+        picked up if it can be.
+        """
+        held = self.held
+        if held is not None:
+            self.held = None
+            if sprite is held:
+                return
+            verb = COMBINE if sprite.IN_INVENTORY else USE
+            if not self.interact(verb, held, sprite):
+                self.show_message("That doesn't do anything.")
+            return
+
+        if self.interact(USE, sprite):
+            return
+
+        if sprite.IN_INVENTORY:
+            self.held = sprite
+            self.show_message(f"Use the {sprite.name} with...")
+
+        elif distance < PICKUP_DISTANCE and sprite.CAN_BE_PICKED_UP:
+            self.pick_up(sprite)
+
+    def pick_up(self, sprite):
+        sprite.world_position = sprite.position
+        self.level_sprites.remove(sprite)
+        self.inventory.add(sprite)
+        self.saves.mark_dirty(sprite)
+        if game_log.info:
+            game_log.event(INFO, "pickup", tick=self.clock.steps,
+                           item=sprite.name, id=sprite.save_id,
+                           room=self.room.number, x=sprite.center_x,
+                           y=sprite.center_y)
+        self.show_message(f"You picked up the {sprite.name}.")
+        sprite.IN_INVENTORY = True
+
+    def key_press(self, key):
+        """
+        Handle a key the game itself responds to.
+        """
+        if key == SAVE_KEY:
+            filename = self.save_dir / 'quicksave.sav'
+            self.saves.save(filename)
+            if save_log.info:
+                save_log.event(INFO, "save", tick=self.clock.steps,
+                               file=filename)
+            self.show_message("Saved.")
+
+        elif key == LOAD_KEY:
+            self.quick_load()
+
+    def quick_load(self):
+        """ Load the quick save, or failing that the autosave. """
+        # Don't read a save that is still being written
+        self.saves.wait()
+        for name in ('quicksave.sav', 'autosave.sav'):
+            filename = self.save_dir / name
+            if filename.exists():
+                try:
+                    self.saves.load(filename)
+                except SaveError as error:
+                    if save_log.warning:
+                        save_log.event(WARNING, "load failed",
+                                       tick=self.clock.steps, file=filename,
+                                       error=str(error))
+                    self.show_message(str(error))
+                else:
+                    if save_log.info:
+                        save_log.event(INFO, "load", tick=self.clock.steps,
+                                       file=filename)
+                    self.show_message("Loaded.")
+                return
+        self.show_message("Nothing to load.")
+
+    def sprite_at(self, x, y):
+        """
+        The topmost sprite under (x, y), or None. The inventory is drawn
+        over the world, so it is checked first.
+        """
+        sprite = self.inventory.sprite_at(x, y)
+        if sprite is None:
+            sprite = self.level_sprites.sprite_at(x, y)
+        return sprite
+
+    def click(self, x, y, button):
+        """
+        Handle a mouse click at (x, y).
+        """
+        # Cursor mode, inventory, the player's path: assume it all changed
+        self.dirty = True
+
+        left_click = button == arcade.MOUSE_BUTTON_LEFT
+        right_click = button == arcade.MOUSE_BUTTON_RIGHT
+        middle_click = button == arcade.MOUSE_BUTTON_MIDDLE
+
+        is_use_cursor = self.cursor_mode == CURSOR_USE
+        is_examine_cursor = self.cursor_mode == CURSOR_EXAMINE
+
+        if (right_click and is_examine_cursor or
+                middle_click and is_use_cursor):
+            self.cursor_mode = CURSOR_MOVE
+
+        elif right_click:
+            self.cursor_mode = CURSOR_EXAMINE
+
+        elif middle_click:
+            self.cursor_mode = CURSOR_USE
+
+        # Level items (not picked up)
+        sprite = self.sprite_at(x, y)
+        if sprite is self.player_sprite:
+            # The player stands in front of items, but isn't one
+            sprite = None
+
+        distance_x = self.player_sprite.center_x - x
+        distance_y = self.player_sprite.bottom - y
+        distance = int(sqrt(distance_x**2+distance_y**2))
+
+        if not is_use_cursor or self.cursor_mode != CURSOR_USE:
+            # Changing mode puts down whatever was held
+            self.held = None
+
+        if sprite is not None and left_click and is_use_cursor:
+            self.use(sprite, distance)
+
+        elif sprite is not None and left_click and is_examine_cursor:
+            self.examine(sprite)
+
+        elif left_click:
+            # None when the click is off the walkable area or unreachable
+            with profiler.scope("pathfind"):
+                walk_path = self.room.navmesh.find_path(
+                    (self.player_sprite.center_x, self.player_sprite.bottom),
+                    (x, y))
+            if walk_path is not None:
+                self.cursor_mode = CURSOR_MOVE
+                self.player_sprite.walk_to(walk_path)
+
+        arrow_x_values = []
+        arrow_y_values = []
+
+        for arrow in range(2):
+            for point in self.inventory_arrows[arrow].get_adjusted_hit_box():
+                arrow_x_values.append(int(point[0]))
+                arrow_y_values.append(int(point[1]))
+
+            arrow_x_range = range(min(arrow_x_values), max(arrow_x_values))
+            arrow_y_range = range(min(arrow_y_values), max(arrow_y_values))
+
+            if left_click and x in arrow_x_range and y in arrow_y_range:
+                if arrow == 0:
+                    self.inventory.arrow('up')
+                    self.saves.mark_dirty()
+                    break
+                if arrow == 1:
+                    self.inventory.arrow('down')
+                    self.saves.mark_dirty()
+
+        # # TODO Inventory items
+        # for item in self.inventory:
+        #     x_range = range(item.center_x-pad, item.center_x+pad)
+        #     y_range = range(item.center_y-pad, item.center_y+pad)
+        #
+        #     if x in x_range and y in y_range:
+        #         pass
+        #
+        # else:
+        #     if (item not in self.level_sprites
+        #             and button is not arcade.MOUSE_BUTTON_MIDDLE
+        #             and int(y) > 150):
+        #         self.cursor_mode = CURSOR_MOVE
+        #         if DEBUG:
+        #             print("Moving to mouse position!")
+        #
+        #         self.player_sprite.goto_x = x
+        #         self.player_sprite.goto_y = y
+        #
+        #         dx = (x - self.player_sprite.center_x)
+        #         dy = (y - self.player_sprite.bottom)
+        #         magnitude = sqrt(dx**2+dy**2)
+        #         self.player_sprite.change_x = MOVEMENT_SPEED*(dx)/magnitude
+        #         self.player_sprite.change_y = MOVEMENT_SPEED*(dy)/magnitude
@@ -0,0 +1,114 @@
+"""
+Native mouse cursors.
+
+The sprite cursor is drawn along with everything else, so it trails the
+real pointer by at least one rendered frame and costs a draw call of its
+own. pyglet 1.5.11 and later can hand an ImageMouseCursor to the OS
+instead (acceleration=True), and the OS draws it wherever the pointer is,
+however fast or slow the game is rendering.
+
+NativeCursors makes one OS cursor per image, sized the way the sprite
+cursor shows it, and plays animation clips (see animation.py) whose
+frames are cursor images, such as the hourglass in cursor_spliced. The
+window's cursor is only replaced when the frame actually changes, since
+each change uploads the image to the OS again.
+
+With an older pyglet, native_cursors_supported() is False and the game
+keeps drawing the sprite cursor.
+"""
+# Standard Library
+from inspect import signature
+
+# Third Party
+import PIL.Image
+import pyglet
+from pyglet.window import ImageMouseCursor
+
+# Local
+from .animation import Animator, frame_table
+
+
+def cursor_image(filename, scale=1):
+    """ A pyglet image of filename, resized by scale. """
+    image = PIL.Image.open(filename).convert("RGBA")
+    if scale != 1:
+        size = (max(1, round(image.width * scale)),
+                max(1, round(image.height * scale)))
+        # Pixel art upscales blocky; downscaling wants smoothing
+        resample = PIL.Image.NEAREST if scale > 1 else PIL.Image.LANCZOS
+        image = image.resize(size, resample)
+    # pyglet rows go bottom to top
+    image = image.transpose(PIL.Image.FLIP_TOP_BOTTOM)
+    return pyglet.image.ImageData(
+        image.width, image.height, "RGBA", image.tobytes())
+
+
+def native_cursor(filename, scale=1):
+    '''
+    An OS-drawn cursor for filename, with its hot spot in the middle like
+    the sprite cursor's. Needs a GL context (a window) to exist. Raises
+    TypeError on a pyglet too old to draw cursors natively.
+    '''
+    image = cursor_image(filename, scale)
+    return ImageMouseCursor(image, image.width // 2, image.height // 2,
+                            acceleration=True)
+
+
+def native_cursors_supported():
+    """ Whether this pyglet can pass image cursors to the OS. """
+    return "acceleration" in signature(ImageMouseCursor).parameters
+
+
+class NativeCursors():
+    '''
+    The window's OS cursor: a still image by index, or an animation clip.
+    '''
+    def __init__(self, window, filenames, scales, animations,
+                 animation_scale=1):
+        self.window = window
+        self.cursors = [native_cursor(filename, scale)
+                        for filename, scale in zip(filenames, scales)]
+        self.animations = animations
+        self.animation_scale = animation_scale
+        self.clips = {}
+
+        self.animator = None
+        self.current = None
+
+    def _set(self, cursor):
+        if cursor is not self.current:
+            self.current = cursor
+            self.window.set_mouse_cursor(cursor)
+
+    def show(self, index):
+        """ Show still cursor index, stopping any animation. """
+        self.animator = None
+        self._set(self.cursors[index])
+
+    def clip(self, name):
+        table = self.clips.get(name)
+        if table is None:
+            table = self.clips[name] = frame_table(
+                name, self.animations.definition(name),
+                self.animations.img_dir,
+                lambda filename: native_cursor(filename,
+                                               self.animation_scale))
+        return table
+
+    def play(self, name):
+        """ Animate the cursor with clip name, carrying on if it is. """
+        clip = self.clip(name)
+        if self.animator is None:
+            self.animator = Animator(clip)
+        else:
+            self.animator.play(clip)
+        self._set(self.animator.texture())
+
+    @property
+    def playing(self):
+        return self.animator is not None
+
+    def update(self, delta_time):
+        if self.animator is not None:
+            self.animator.update(delta_time)
+            self._set(self.animator.texture())
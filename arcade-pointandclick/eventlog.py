@@ -0,0 +1,234 @@
+"""
+Structured event log.
+
+Code logs through a category, after checking the category wants that
+level:
+
+    if inventory_log.debug:
+        inventory_log.event(DEBUG, "page", row=self.row_index)
+
+Each category's debug/info/warning/error switches are plain attributes,
+recomputed only when levels change or the log is opened. A disabled check
+is one attribute load and a branch, and the record (with its fields) is
+never built. Until open() is called every switch is off.
+
+Records are (time, category, level, event, fields) tuples, pushed onto a
+fixed-size ring on the game thread. A background thread drains the ring a
+few times a second and writes one JSON object per line, to a file or to
+stderr, so the game thread never formats text or waits on a terminal. If
+the writer falls behind and the ring fills up, new records are dropped and
+counted rather than blocking the game; the count is logged when the writer
+catches up.
+
+Game events (pickup, examine, room changes, saves) carry the simulation
+tick, so a session log lines up with its replay log.
+"""
+# Standard Library
+import atexit
+import json
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR,
+          "off": OFF}
+LEVEL_NAMES = {level: name for name, level in LEVELS.items()}
+
+# Records the ring holds before new ones are dropped
+RING_SIZE = 8192
+
+# How often the writer thread wakes up to drain the ring
+DRAIN_SECONDS = 0.2
+
+
+class EventRing():
+    '''
+    Fixed-size queue for one producer thread and one consumer thread.
+
+    Only the producer moves written and only the consumer moves read, so
+    neither needs a lock. A full ring drops new records instead of waiting.
+    '''
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.written = 0
+        self.read = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.written - self.read
+
+    def push(self, record):
+        if self.written - self.read >= self.capacity:
+            self.dropped += 1
+            return
+        # Fill the slot before publishing it
+        self.slots[self.written % self.capacity] = record
+        self.written += 1
+
+    def pop_all(self):
+        """ Everything pushed so far, oldest first. """
+        written = self.written
+        records = []
+        for count in range(self.read, written):
+            index = count % self.capacity
+            records.append(self.slots[index])
+            self.slots[index] = None
+        self.read = written
+        return records
+
+
+class LogCategory():
+    '''
+    One category of events, with a switch per level.
+    '''
+    __slots__ = ("log", "name", "debug", "info", "warning", "error")
+
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+        self.set_level(OFF)
+
+    def set_level(self, level):
+        self.debug = level <= DEBUG
+        self.info = level <= INFO
+        self.warning = level <= WARNING
+        self.error = level <= ERROR
+
+    def event(self, level, name, **fields):
+        """ Queue a record. Check the level's switch first. """
+        self.log.ring.push((time.time(), self.name, level, name, fields))
+
+
+def parse_levels(spec):
+    '''
+    Read "info" or "info,inventory=debug" into (default level,
+    {category: level}).
+    '''
+    default = INFO
+    levels = {}
+    for part in filter(None, spec.split(",")):
+        category, _, name = part.rpartition("=")
+        try:
+            level = LEVELS[name.strip().lower()]
+        except KeyError:
+            raise ValueError(f"Unknown log level {name}")
+        if category:
+            levels[category.strip()] = level
+        else:
+            default = level
+    return default, levels
+
+
+class EventLog():
+    '''
+    Categories, the ring they write to, and the thread that empties it.
+    '''
+    def __init__(self, ring_size=RING_SIZE):
+        self.ring = EventRing(ring_size)
+        self.categories = {}
+        self.default_level = INFO
+        self.levels = {}
+
+        self.file = None
+        self.close_file = False
+        self.thread = None
+        self.stopping = threading.Event()
+        self.reported_dropped = 0
+
+    @property
+    def enabled(self):
+        return self.file is not None
+
+    def category(self, name):
+        category = self.categories.get(name)
+        if category is None:
+            category = self.categories[name] = LogCategory(self, name)
+            self._apply(category)
+        return category
+
+    def _apply(self, category):
+        if self.file is None:
+            category.set_level(OFF)
+        else:
+            category.set_level(
+                self.levels.get(category.name, self.default_level))
+
+    def set_levels(self, default_level, levels=None):
+        """ Set the default level and any per-category overrides. """
+        self.default_level = default_level
+        self.levels = dict(levels or {})
+        for category in self.categories.values():
+            self._apply(category)
+
+    def open(self, target="-", levels=None):
+        '''
+        Start logging to file target ("-" for stderr), with levels as
+        parse_levels reads them.
+        '''
+        self.close()
+        if levels is not None:
+            self.set_levels(*parse_levels(levels))
+
+        if target == "-":
+            self.file = sys.stderr
+            self.close_file = False
+        else:
+            self.file = open(target, "w")
+            self.close_file = True
+
+        self.stopping.clear()
+        self.thread = threading.Thread(
+            target=self._run, name="event log", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+        for category in self.categories.values():
+            self._apply(category)
+
+    def close(self):
+        """ Stop logging, writing out whatever is still queued. """
+        if self.file is None:
+            return
+        for category in self.categories.values():
+            category.set_level(OFF)
+
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+        self._drain()
+
+        if self.close_file:
+            self.file.close()
+        self.file = None
+        atexit.unregister(self.close)
+
+    def _run(self):
+        while not self.stopping.wait(DRAIN_SECONDS):
+            self._drain()
+
+    def _drain(self):
+        records = self.ring.pop_all()
+        dropped = self.ring.dropped
+        if dropped != self.reported_dropped:
+            records.append((time.time(), "log", WARNING, "dropped",
+                            {"count": dropped - self.reported_dropped}))
+            self.reported_dropped = dropped
+        if not records:
+            return
+
+        lines = []
+        for when, category, level, name, fields in records:
+            record = {"time": round(when, 6), "category": category,
+                      "level": LEVEL_NAMES.get(level, level), "event": name}
+            record.update(fields)
+            lines.append(json.dumps(record, default=str))
+            lines.append("\n")
+        self.file.write("".join(lines))
+        self.file.flush()
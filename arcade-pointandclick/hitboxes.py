@@ -0,0 +1,109 @@
+"""
+Persistent hit-box cache.
+
+arcade computes a sprite's hit box by scanning the alpha channel of its
+texture, and used to do so for every texture on every launch. HitBoxCache
+remembers the result on disk, keyed by the image file's content hash and
+the hit-box algorithm, so warm starts skip the pixel scan entirely.
+
+Points are stored unscaled, the way arcade wants them (Sprite applies its
+own scale), so one entry serves every scale an image is drawn at. Mirrored
+textures reuse the unmirrored entry with x negated.
+"""
+# Standard Library
+import hashlib
+import json
+import os
+from pathlib import Path
+
+# Third Party
+import PIL.Image
+import arcade
+
+# Bump when arcade's hit-box calculation changes
+HIT_BOX_ALGORITHM = "calculate_points-1"
+
+
+def file_hash(filename):
+    with open(filename, "rb") as image_file:
+        return hashlib.sha1(image_file.read()).hexdigest()
+
+
+def mirror_points(points):
+    '''
+    Hit box of the left-right mirror image, keeping the winding order.
+
+    arcade's points are pixel indices less half the width, so a mirrored
+    column lands one pixel further left than plain negation would put it.
+    '''
+    return [[-1 - x, y] for x, y in reversed(points)]
+
+
+class HitBoxCache():
+    '''
+    Image content hash -> hit-box points, backed by a JSON file.
+    '''
+    def __init__(self, cache_path, algorithm=HIT_BOX_ALGORITHM):
+        self.cache_path = Path(cache_path)
+        self.algorithm = algorithm
+
+        self.entries = None
+        self.hashes = {}
+        self.dirty = False
+
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        self.entries = {}
+        try:
+            with open(self.cache_path) as cache_file:
+                self.entries = json.load(cache_file)
+        except (OSError, ValueError):
+            pass
+
+    def content_hash(self, filename):
+        filename = str(filename)
+        if filename not in self.hashes:
+            self.hashes[filename] = file_hash(filename)
+        return self.hashes[filename]
+
+    def points(self, filename, image=None, mirrored=False, content_hash=None):
+        """
+        Hit box for an image file, scanning image (or the file, if no
+        decoded image is given) only on a cache miss.
+
+        image is expected to be unmirrored.
+        """
+        if self.entries is None:
+            self._load()
+
+        if content_hash is None:
+            content_hash = self.content_hash(filename)
+        key = f"{content_hash}:{self.algorithm}"
+
+        points = self.entries.get(key)
+        if points is None:
+            self.misses += 1
+            if image is None:
+                image = PIL.Image.open(filename).convert("RGBA")
+            points = [list(point) for point in arcade.calculate_points(image)]
+            self.entries[key] = points
+            self.dirty = True
+        else:
+            self.hits += 1
+
+        return mirror_points(points) if mirrored else points
+
+    def save(self):
+        """ Write the cache out if anything new was computed. """
+        if not self.dirty:
+            return
+
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Per process, so games saving at the same time can't clash
+        temp_path = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, "w") as cache_file:
+            json.dump(self.entries, cache_file)
+        os.replace(temp_path, self.cache_path)
+        self.dirty = False
@@ -0,0 +1,71 @@
+"""
+Static HUD geometry.
+
+The inventory panel never changes between frames, so instead of issuing a
+draw_rectangle_filled per slot every frame it is baked once into a
+ShapeElementList (one vertex buffer, one draw call) and only rebuilt when
+the layout changes.
+"""
+# Third Party
+import arcade
+
+
+class InventoryPanel():
+    '''
+    Black panel along the bottom of the screen with a grid of item slots.
+
+    Slot (column, row) is centred on
+    (column * slot_pitch + margin, row * slot_pitch + margin), which is where
+    Inventory places item sprites.
+    '''
+    def __init__(self, width, height=150, columns=8, rows=2,
+                 slot_size=64, slot_pitch=80, margin=50,
+                 color=arcade.csscolor.BLACK,
+                 slot_color=arcade.csscolor.RED):
+        self.width = width
+        self.height = height
+        self.columns = columns
+        self.rows = rows
+        self.slot_size = slot_size
+        self.slot_pitch = slot_pitch
+        self.margin = margin
+        self.color = color
+        self.slot_color = slot_color
+
+        self.shapes = None
+
+    def set_layout(self, **kwargs):
+        """
+        Change any of the constructor's layout arguments. The baked geometry
+        is only thrown away if something actually changed.
+        """
+        for name, value in kwargs.items():
+            if not hasattr(self, name):
+                raise AttributeError(f"InventoryPanel has no {name} setting")
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                self.shapes = None
+
+    def slot_center(self, column, row):
+        return (column * self.slot_pitch + self.margin,
+                row * self.slot_pitch + self.margin)
+
+    def build(self):
+        self.shapes = arcade.ShapeElementList()
+
+        # The panel runs a little past the HUD so it tucks under the bottom
+        # edge of the room background.
+        self.shapes.append(arcade.create_rectangle_filled(
+            self.width / 2, self.height / 2,
+            self.width, self.height + 50, self.color))
+
+        for column in range(self.columns):
+            for row in range(self.rows):
+                x, y = self.slot_center(column, row)
+                self.shapes.append(arcade.create_rectangle_filled(
+                    x, y, self.slot_size, self.slot_size, self.slot_color))
+
+    def draw(self):
+        if self.shapes is None:
+            self.build()
+        self.shapes.draw()
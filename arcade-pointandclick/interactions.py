@@ -0,0 +1,182 @@
+"""
+Item interaction rules.
+
+What examining, using and combining items does is described in
+resources/rules.json rather than in code:
+
+    {"verb": "use", "subject": "book", "target": "Fire hydrant",
+     "requires": {"flags": [], "not": ["hydrant_calm"], "has": ["book"],
+                  "room": 0},
+     "effects": [{"message": "You read it a story."},
+                 {"set": "hydrant_calm"}, {"remove": "subject"}]}
+
+verb is "examine" or "use" (subject alone, or subject on target), or
+"combine" (two carried items, either way round). subject and target are
+item names, or "*" for any item. requires lists flags that must be set,
+flags that must not be, items that must be carried and the room the
+player must be in; all are optional. Rules for the same click are tried in
+file order and the first whose requirements hold wins.
+
+Effects:
+
+    {"message": text}       show text
+    {"set": flag}           set a flag
+    {"clear": flag}         clear a flag
+    {"remove": which}       take "subject", "target" or a named item out
+                            of the game
+    {"give": name}          put the named item in the inventory
+
+Rules are compiled into a dict keyed by (verb, subject, target), so
+resolving a click is at most four dict lookups (exact, then each side as
+"*", then both), however many rules and items there are. Effects are not
+applied when the rule fires but queued, and the core applies the whole
+batch at the end of the tick.
+"""
+# Standard Library
+from collections import namedtuple
+import json
+
+EXAMINE = "examine"
+USE = "use"
+COMBINE = "combine"
+VERBS = (EXAMINE, USE, COMBINE)
+
+ANY = "*"
+
+Rule = namedtuple("Rule", [
+    "verb", "subject", "target", "flags", "not_flags", "has", "room",
+    "effects",
+])
+
+EFFECT_KINDS = ("message", "set", "clear", "remove", "give")
+
+
+class RuleError(Exception):
+    pass
+
+
+def _effect(number, data):
+    kinds = [kind for kind in EFFECT_KINDS if kind in data]
+    if len(kinds) != 1:
+        raise RuleError(f"Rule {number} has an effect that isn't exactly "
+                        f"one of {', '.join(EFFECT_KINDS)}: {data}")
+    kind = kinds[0]
+    return (kind, data[kind])
+
+
+def compile_rules(source):
+    '''
+    Build the dispatch table, {(verb, subject, target): (Rule, ...)}, from
+    the parsed rules file. target is None for rules without one.
+    '''
+    table = {}
+    for number, data in enumerate(source.get("rules", [])):
+        verb = data.get("verb")
+        if verb not in VERBS:
+            raise RuleError(f"Rule {number} has unknown verb {verb}")
+        subject = data.get("subject", ANY)
+        target = data.get("target")
+        if verb == COMBINE and target is None:
+            raise RuleError(f"Rule {number} combines {subject} with nothing")
+
+        requires = data.get("requires", {})
+        rule = Rule(
+            verb, subject, target,
+            frozenset(requires.get("flags", ())),
+            frozenset(requires.get("not", ())),
+            tuple(requires.get("has", ())),
+            requires.get("room"),
+            tuple(_effect(number, effect)
+                  for effect in data.get("effects", ())),
+        )
+
+        keys = [(verb, subject, target)]
+        if verb == COMBINE and subject != target:
+            # Either item can be the one picked up first
+            keys.append((verb, target, subject))
+        for key in keys:
+            table[key] = table.get(key, ()) + (rule,)
+    return table
+
+
+class InteractionEngine():
+    '''
+    Looks up the rule for a click and queues its effects.
+
+    The game state rules can test and change is the set of flags, which
+    items are carried (has) and the room number; the core passes what it
+    knows into resolve() and applies queued effects with apply().
+    '''
+    def __init__(self, rules_path):
+        self.rules_path = rules_path
+        self.table = None
+
+        self.flags = set()
+        # Effects waiting for the end of the tick: (effects, subject, target)
+        self.pending = []
+
+    def _load(self):
+        try:
+            with open(self.rules_path) as rules_file:
+                source = json.load(rules_file)
+        except FileNotFoundError:
+            source = {}
+        self.table = compile_rules(source)
+
+    def _allowed(self, rule, carried, room):
+        if not rule.flags <= self.flags:
+            return False
+        if rule.not_flags & self.flags:
+            return False
+        if rule.room is not None and rule.room != room:
+            return False
+        return all(name in carried for name in rule.has)
+
+    def resolve(self, verb, subject, target=None, carried=(), room=None):
+        '''
+        The first rule for verb on subject (and target) whose requirements
+        hold, or None. carried is a container of carried item names.
+        '''
+        if self.table is None:
+            self._load()
+        table = self.table
+        for key in ((verb, subject, target), (verb, ANY, target),
+                    (verb, subject, ANY), (verb, ANY, ANY)):
+            if key[2] == ANY and target is None:
+                continue
+            for rule in table.get(key, ()):
+                if self._allowed(rule, carried, room):
+                    return rule
+        return None
+
+    def restore(self, flags):
+        """ Replace the flags, e.g. from a save game. """
+        self.flags = set(flags)
+        self.pending = []
+
+    def queue(self, rule, subject=None, target=None):
+        """ Run rule's effects at the end of the tick. """
+        self.pending.append((rule.effects, subject, target))
+
+    def apply(self, core):
+        '''
+        Apply every queued effect, in the order queued. core provides
+        show_message, remove_item(item) and give_item(name).
+        '''
+        if not self.pending:
+            return False
+        pending, self.pending = self.pending, []
+        for effects, subject, target in pending:
+            for kind, value in effects:
+                if kind == "message":
+                    core.show_message(value)
+                elif kind == "set":
+                    self.flags.add(value)
+                elif kind == "clear":
+                    self.flags.discard(value)
+                elif kind == "remove":
+                    item = {"subject": subject, "target": target}.get(value)
+                    core.remove_item(item if item is not None else value)
+                elif kind == "give":
+                    core.give_item(value)
+        return True
@@ -0,0 +1,221 @@
+"""
+Render layers.
+
+The world used to be re-sorted into a plain list every tick and drawn one
+sprite (and one GPU draw call) at a time. WorldLayer keeps a single
+SpriteList in depth order instead, so the whole world is one batched draw.
+"""
+# Standard Library
+from operator import attrgetter, itemgetter
+
+# Third Party
+import numpy as np
+
+# Local
+from .spatial import IndexedSpriteList
+
+# Moved sprites are stepped into place one at a time up to this many; past
+# that they are merged into the unmoved ones in one pass
+RESLOT_LIMIT = 16
+
+_position = attrgetter("_position")
+_second = itemgetter(1)
+
+
+class WorldLayer(IndexedSpriteList):
+    '''
+    World sprites, kept sorted back-to-front by their bottom edge.
+
+    Sprites further up the screen are further away and drawn first. The
+    depth of every sprite as of the last sort is kept alongside the list,
+    so only sprites that moved or resized since then are looked at again:
+    a few are stepped past their out-of-order neighbours, a crowd is sorted
+    on its own and merged back in.
+    '''
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Sprites to re-slot, with their new y if it came with a batch move
+        self.moved = {}
+        # Depths in list order, None after sprites are added or removed
+        self.depths = None
+
+    def _depths(self, sprites, ys=None):
+        """
+        The bottom of each sprite's hit box, as the spatial hash has it.
+        Sprites are taken to be at ys, where given and not nan.
+        """
+        # No Python call per sprite, crowds move every step
+        if ys is None:
+            ys = np.fromiter(map(_second, map(_position, sprites)),
+                             dtype=float, count=len(sprites))
+        else:
+            for i in np.flatnonzero(np.isnan(ys)).tolist():
+                ys[i] = sprites[i].position[1]
+        extents = map(self.spatial_hash.extents.__getitem__, sprites)
+        return ys + np.fromiter(map(_second, extents),
+                                dtype=float, count=len(sprites))
+
+    def _moved(self, sprite):
+        # Keep the y if the sprite has one, a resize doesn't move it
+        self.moved.setdefault(sprite, None)
+
+    def append(self, item):
+        super().append(item)
+        self._moved(item)
+        self.depths = None
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self._moved(item)
+        self.depths = None
+
+    def remove(self, item):
+        super().remove(item)
+        self.moved.pop(item, None)
+        self.depths = None
+
+    def clear(self):
+        super().clear()
+        self.moved.clear()
+        self.depths = None
+
+    def update_location(self, sprite):
+        self.moved[sprite] = None
+        super().update_location(sprite)
+
+    def update_locations(self, sprites, xs, ys):
+        self.moved.update(zip(sprites, ys))
+        super().update_locations(sprites, xs, ys)
+
+    def update_size(self, sprite):
+        self._moved(sprite)
+        super().update_size(sprite)
+
+    def update_height(self, sprite):
+        self._moved(sprite)
+        super().update_height(sprite)
+
+    def update_width(self, sprite):
+        self._moved(sprite)
+        super().update_width(sprite)
+
+    def _reslot(self, sprite):
+        """ Step a sprite towards its depth slot, return True if it moved. """
+        order = self.sprite_list
+        depths = self.depths
+        start = index = self.sprite_idx[sprite]
+        depth = depths[index]
+
+        while index + 1 < len(order) and depths[index + 1] > depth:
+            order[index] = order[index + 1]
+            depths[index] = depths[index + 1]
+            self.sprite_idx[order[index]] = index
+            index += 1
+
+        while index > 0 and depths[index - 1] < depth:
+            order[index] = order[index - 1]
+            depths[index] = depths[index - 1]
+            self.sprite_idx[order[index]] = index
+            index -= 1
+
+        order[index] = sprite
+        depths[index] = depth
+        self.sprite_idx[sprite] = index
+        return index != start
+
+    def sort_by_depth(self):
+        """
+        Restore back-to-front order after sprites moved.
+
+        Untouched sprites are already in order and their depths are known,
+        so only the moved ones have their depth taken and get sorted.
+        """
+        if not self.moved:
+            return
+
+        moved = list(self.moved)
+        # None, for sprites that moved on their own, comes out as nan
+        ys = np.array(list(self.moved.values()), dtype=float)
+        self.moved.clear()
+
+        if self.depths is None:
+            # Sprites came or went since the last sort, usually a room
+            # change where nearly everything is new anyway
+            reordered = self._sort_all()
+        elif len(moved) <= RESLOT_LIMIT:
+            reordered = self._reslot_all(moved, self._depths(moved, ys))
+        else:
+            reordered = self._merge(moved, self._depths(moved, ys))
+
+        if reordered and self._vao1 is not None:
+            # Instance buffers are laid out in list order
+            self._calculate_sprite_buffer()
+
+    def _sort_all(self):
+        depths = self._depths(self.sprite_list)
+        # Stable, so equal depths keep their order as _reslot would
+        index = np.argsort(-depths, kind="stable")
+        self.depths = depths[index]
+        if (index == np.arange(len(index))).all():
+            return False
+        order = [self.sprite_list[i] for i in index.tolist()]
+        self.sprite_list = order
+        self.sprite_idx = {sprite: index for index, sprite in enumerate(order)}
+        return True
+
+    def _reslot_all(self, moved, depths):
+        for sprite, depth in zip(moved, depths.tolist()):
+            self.depths[self.sprite_idx[sprite]] = depth
+
+        reordered = False
+        shuffled = True
+        while shuffled:
+            # Two moved sprites can block each other, so repeat until a
+            # pass leaves everything where it was.
+            shuffled = False
+            for sprite in moved:
+                if self._reslot(sprite):
+                    shuffled = reordered = True
+        return reordered
+
+    def _merge(self, moved, depths):
+        """ Sort the moved sprites and merge them back into the rest. """
+        count = len(self.sprite_list)
+        index = np.fromiter(map(self.sprite_idx.__getitem__, moved),
+                            dtype=np.intp, count=len(moved))
+
+        # Back to front, with ties in their old order
+        by_depth = np.lexsort((index, -depths))
+        index = index[by_depth]
+        depths = depths[by_depth]
+
+        still = np.ones(count, dtype=bool)
+        still[index] = False
+        kept = np.flatnonzero(still)
+        kept_depths = self.depths[kept]
+
+        # Each moved sprite goes after the unmoved ones at least as far back
+        after = np.searchsorted(-kept_depths, -depths, side="right")
+        moved_slots = after + np.arange(len(index))
+        kept_slots = np.arange(len(kept))
+        kept_slots += np.searchsorted(after, kept_slots, side="right")
+
+        order = np.empty(count, dtype=np.intp)
+        order[moved_slots] = index
+        order[kept_slots] = kept
+        self.depths = np.empty(count, dtype=float)
+        self.depths[moved_slots] = depths
+        self.depths[kept_slots] = kept_depths
+
+        changed = np.flatnonzero(order != np.arange(count))
+        if not len(changed):
+            return False
+
+        # Only the stretch between the first and last sprite that changed
+        # places is rewritten
+        start, stop = int(changed[0]), int(changed[-1]) + 1
+        span = list(map(self.sprite_list.__getitem__,
+                        order[start:stop].tolist()))
+        self.sprite_list[start:stop] = span
+        self.sprite_idx.update(zip(span, range(start, stop)))
+        return True
@@ -0,0 +1,107 @@
+"""
+Pixel-accurate hit testing.
+
+Bounding boxes made the transparent corners of the tires and the hydrant
+clickable. AlphaMask keeps one bit per texture pixel (opaque or not),
+packed eight to a byte with numpy.packbits, and answers "is this pixel
+opaque" with a couple of array lookups. Masks are built the first time a
+texture is hit-tested and shared by every sprite using it.
+
+Points are mapped into texture pixels through the sprite's position, scale
+and angle, so one mask serves every scale a texture is drawn at. The atlas
+tags mirrored textures with the image they came from, and they reuse the
+unmirrored mask with the column flipped.
+"""
+# Standard Library
+from math import cos, floor, radians, sin
+
+# Third Party
+import numpy as np
+
+# Pixels with alpha above this count as solid
+ALPHA_THRESHOLD = 0
+
+
+class AlphaMask():
+    '''
+    Bit-packed opacity of an image, row 0 at the top.
+    '''
+    def __init__(self, image, threshold=ALPHA_THRESHOLD):
+        alpha = np.asarray(image.convert("RGBA"))[:, :, 3]
+        self.height, self.width = alpha.shape
+        self.bits = np.packbits(alpha > threshold, axis=1)
+
+    def flipped(self):
+        """ The mask of the left-right mirror image. """
+        mask = AlphaMask.__new__(AlphaMask)
+        mask.width, mask.height = self.width, self.height
+        solid = np.unpackbits(self.bits, axis=1)[:, :self.width]
+        mask.bits = np.packbits(solid[:, ::-1], axis=1)
+        return mask
+
+    def __contains__(self, pixel):
+        column, row = pixel
+        if not (0 <= column < self.width and 0 <= row < self.height):
+            return False
+        return bool(self.bits[row, column >> 3] & (0x80 >> (column & 7)))
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+
+class MaskCache():
+    '''
+    AlphaMasks by texture, shared between mirror-image pairs.
+    '''
+    def __init__(self):
+        self.masks = {}
+
+    def _key(self, texture):
+        # (source, mirrored) when the atlas tagged the texture
+        return getattr(texture, "mask_key", None) or (texture.name, False)
+
+    def mask(self, texture):
+        """ (mask, mirrored) for a texture; mirrored masks flip columns. """
+        source, mirrored = self._key(texture)
+        mask = self.masks.get(source)
+        if mask is None:
+            mask = AlphaMask(texture.image)
+            if mirrored:
+                # Keep the unmirrored mask, so its partner can share it
+                mask = mask.flipped()
+            self.masks[source] = mask
+        return mask, mirrored
+
+    def sprite_contains(self, sprite, x, y):
+        """
+        True if (x, y) lands on an opaque pixel of the sprite. Callers
+        should reject points outside the sprite's bounds first.
+        """
+        texture = sprite.texture
+        if texture is None or texture.image is None:
+            return True
+        mask, mirrored = self.mask(texture)
+
+        # Into the sprite's own frame, in texture pixels
+        dx = x - sprite.center_x
+        dy = y - sprite.center_y
+        if sprite.angle:
+            angle = radians(-sprite.angle)
+            dx, dy = (dx * cos(angle) - dy * sin(angle),
+                      dx * sin(angle) + dy * cos(angle))
+        scale = sprite.scale or 1
+
+        column = floor(dx / scale + mask.width / 2)
+        row = floor(mask.height / 2 - dy / scale)
+        if mirrored:
+            column = mask.width - 1 - column
+        return (column, row) in mask
+
+    @property
+    def nbytes(self):
+        return sum(mask.nbytes for mask in self.masks.values())
+
+
+# Shared by every sprite list that hit-tests
+alpha_masks = MaskCache()
@@ -0,0 +1,301 @@
+"""
+Walkable areas and click-to-move pathfinding.
+
+A room's walkable area is a polygon, less any obstacle polygons inside it
+(the foot of a pile of tires, a hydrant). build_navmesh cuts that area into
+trapezoids with vertical sides: the x of every vertex splits the area into
+slabs, and inside a slab the edges crossing it never cross each other, so
+they can be kept sorted by y. Trapezoids that carry on unchanged into the
+next slab are merged into one cell.
+
+That layout gives O(log n) point queries (bisect for the slab, then bisect
+among its edges), and neighbouring cells always meet along a vertical
+portal, which keeps both A* and string-pulling simple.
+
+All coordinates are the player's feet, i.e. the bottom of the sprite.
+"""
+# Standard Library
+from bisect import bisect_right
+from collections import OrderedDict
+import heapq
+from math import hypot
+
+NAV_PATH_CACHE_SIZE = 32
+
+
+def _polygon_edges(points):
+    # Non-vertical edges only, always stored left to right
+    edges = []
+    for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]):
+        if x0 == x1:
+            continue
+        if x0 > x1:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        edges.append((x0, y0, x1, y1))
+    return edges
+
+
+def _edge_y(edge, x):
+    x0, y0, x1, y1 = edge
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+def build_navmesh(walkable, obstacles=()):
+    '''
+    Decompose the walkable polygon, with obstacles cut out of it, into
+    plain tuples that NavMesh loads. Obstacles must lie inside the
+    walkable polygon and not overlap each other.
+    '''
+    polygons = [list(walkable)] + [list(obstacle) for obstacle in obstacles]
+
+    edges = []
+    for polygon in polygons:
+        edges.extend(_polygon_edges(polygon))
+    xs = sorted({x for polygon in polygons for x, _ in polygon})
+
+    slab_edges = []
+    slab_cells = []
+    cells = []
+    open_cells = {}
+    for left, right in zip(xs, xs[1:]):
+        middle = (left + right) / 2
+        crossing = sorted(
+            (edge for edge in edges if edge[0] <= left and edge[2] >= right),
+            key=lambda edge: _edge_y(edge, middle))
+
+        # Even-odd: the area between the 1st and 2nd edge is walkable, the
+        # 2nd and 3rd is an obstacle, and so on
+        still_open = {}
+        ids = []
+        for bottom, top in zip(crossing[::2], crossing[1::2]):
+            cell_id = open_cells.get((bottom, top))
+            if cell_id is None:
+                cell_id = len(cells)
+                cells.append([left, right, bottom, top])
+            else:
+                cells[cell_id][1] = right
+            still_open[(bottom, top)] = cell_id
+            ids.append(cell_id)
+
+        open_cells = still_open
+        slab_edges.append(tuple(crossing))
+        slab_cells.append(tuple(ids))
+
+    # Cells in neighbouring slabs are linked wherever their sides overlap
+    links = [[] for _ in cells]
+    for index, x in enumerate(xs[1:-1]):
+        for a in slab_cells[index]:
+            for b in slab_cells[index + 1]:
+                if a == b:
+                    continue
+                low = max(_edge_y(cells[a][2], x), _edge_y(cells[b][2], x))
+                high = min(_edge_y(cells[a][3], x), _edge_y(cells[b][3], x))
+                if high > low:
+                    links[a].append((b, x, low, high))
+                    links[b].append((a, x, low, high))
+
+    return (
+        tuple(xs),
+        tuple(slab_edges),
+        tuple(slab_cells),
+        tuple(tuple(cell) for cell in cells),
+        tuple(tuple(cell_links) for cell_links in links),
+    )
+
+
+def _triarea2(a, b, c):
+    return (c[0] - a[0]) * (b[1] - a[1]) - (b[0] - a[0]) * (c[1] - a[1])
+
+
+def string_pull(portals):
+    '''
+    Shortest path through a corridor of (left, right) portals, the first
+    and last being the start and goal points twice over ("simple stupid
+    funnel algorithm").
+    '''
+    apex = portal_left = portal_right = portals[0][0]
+    apex_index = left_index = right_index = 0
+    points = [apex]
+
+    index = 1
+    while index < len(portals):
+        left, right = portals[index]
+
+        # Tighten the right side of the funnel
+        if _triarea2(apex, portal_right, right) <= 0:
+            if (apex == portal_right or
+                    _triarea2(apex, portal_left, right) > 0):
+                portal_right, right_index = right, index
+            else:
+                # Right crossed over left: left becomes a corner
+                apex, apex_index = portal_left, left_index
+                points.append(apex)
+                portal_left = portal_right = apex
+                left_index = right_index = apex_index
+                index = apex_index + 1
+                continue
+
+        # Tighten the left side of the funnel
+        if _triarea2(apex, portal_left, left) >= 0:
+            if (apex == portal_left or
+                    _triarea2(apex, portal_right, left) < 0):
+                portal_left, left_index = left, index
+            else:
+                apex, apex_index = portal_right, right_index
+                points.append(apex)
+                portal_left = portal_right = apex
+                left_index = right_index = apex_index
+                index = apex_index + 1
+                continue
+
+        index += 1
+
+    goal = portals[-1][0]
+    if points[-1] != goal:
+        points.append(goal)
+    return points
+
+
+class NavMesh():
+    '''
+    A room's walkable area, loaded from build_navmesh's tuples.
+
+    Recent (start cell, goal cell) corridors are kept in an LRU cache;
+    string-pulling them again for new end points is cheap.
+    '''
+    def __init__(self, data, cache_size=NAV_PATH_CACHE_SIZE):
+        (self.xs, self.slab_edges, self.slab_cells,
+         self.cells, self.links) = data
+
+        self.centers = []
+        for left, right, bottom, top in self.cells:
+            x = (left + right) / 2
+            self.centers.append(
+                (x, (_edge_y(bottom, x) + _edge_y(top, x)) / 2))
+
+        self.cache_size = cache_size
+        self.corridors = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def locate(self, x, y):
+        """ Index of the cell containing (x, y), or None if not walkable. """
+        slab = bisect_right(self.xs, x) - 1
+        if slab == len(self.slab_edges) and x == self.xs[-1]:
+            slab -= 1
+        if slab < 0 or slab >= len(self.slab_edges):
+            return None
+
+        # Number of edges below the point; odd means inside
+        edges = self.slab_edges[slab]
+        low, high = 0, len(edges)
+        while low < high:
+            middle = (low + high) // 2
+            if _edge_y(edges[middle], x) <= y:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low % 2 == 0:
+            # Points on a top edge still count as inside
+            if low and _edge_y(edges[low - 1], x) == y:
+                low -= 1
+            else:
+                return None
+        return self.slab_cells[slab][low // 2]
+
+    def contains(self, x, y):
+        return self.locate(x, y) is not None
+
+    def nearest_point(self, x, y):
+        """ (cell, point) for the walkable point closest to (x, y). """
+        best = None
+        for index, (left, right, bottom, top) in enumerate(self.cells):
+            near_x = min(max(x, left), right)
+            near_y = min(max(y, _edge_y(bottom, near_x)), _edge_y(top, near_x))
+            distance = hypot(near_x - x, near_y - y)
+            if best is None or distance < best[0]:
+                best = (distance, index, (near_x, near_y))
+        if best is None:
+            return None, None
+        return best[1], best[2]
+
+    def _search(self, start, goal):
+        # A* over cell centres
+        goal_center = self.centers[goal]
+        came_from = {start: None}
+        cost = {start: 0}
+        frontier = [(0, start)]
+
+        while frontier:
+            _, cell = heapq.heappop(frontier)
+            if cell == goal:
+                corridor = []
+                while cell is not None:
+                    corridor.append(cell)
+                    cell = came_from[cell]
+                return corridor[::-1]
+
+            x, y = self.centers[cell]
+            for neighbour, *_ in self.links[cell]:
+                next_x, next_y = self.centers[neighbour]
+                new_cost = cost[cell] + hypot(next_x - x, next_y - y)
+                if new_cost < cost.get(neighbour, float("inf")):
+                    cost[neighbour] = new_cost
+                    came_from[neighbour] = cell
+                    estimate = hypot(goal_center[0] - next_x,
+                                     goal_center[1] - next_y)
+                    heapq.heappush(frontier, (new_cost + estimate, neighbour))
+
+        return None
+
+    def corridor(self, start, goal):
+        """ Cells from start to goal, or None if goal can't be reached. """
+        key = (start, goal)
+        if key in self.corridors:
+            self.hits += 1
+            self.corridors.move_to_end(key)
+            return self.corridors[key]
+
+        self.misses += 1
+        corridor = self._search(start, goal)
+        self.corridors[key] = corridor
+        if len(self.corridors) > self.cache_size:
+            self.corridors.popitem(last=False)
+        return corridor
+
+    def find_path(self, start, goal):
+        """
+        Waypoints from start to goal, not including start. None if goal
+        is not walkable or can't be reached. A start point off the mesh
+        walks back onto it first.
+        """
+        goal_cell = self.locate(*goal)
+        if goal_cell is None:
+            return None
+
+        path = []
+        start_cell = self.locate(*start)
+        if start_cell is None:
+            start_cell, start = self.nearest_point(*start)
+            if start_cell is None:
+                return None
+            path.append(start)
+
+        corridor = self.corridor(start_cell, goal_cell)
+        if corridor is None:
+            return None
+
+        portals = [(tuple(start), tuple(start))]
+        for cell, next_cell in zip(corridor, corridor[1:]):
+            for neighbour, x, low, high in self.links[cell]:
+                if neighbour == next_cell:
+                    break
+            # Left and right as seen walking through the portal
+            if x == self.cells[cell][1]:
+                portals.append(((x, high), (x, low)))
+            else:
+                portals.append(((x, low), (x, high)))
+        portals.append((tuple(goal), tuple(goal)))
+
+        return path + string_pull(portals)[1:]
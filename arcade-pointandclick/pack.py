@@ -0,0 +1,226 @@
+"""
+Pre-decoded asset pack build step and loader.
+
+Build the pack with:
+
+    python -m arcade-pointandclick.pack
+
+Every image under resources/img, room backgrounds included, is decoded
+once at build time and stored raw (RGBA, top row first) in
+resources/assets.pack, along with a mirror image of every character frame.
+The file starts with a small header and a JSON index of where each image's
+pixels are, plus the mtime, size and hash of the PNG they came from:
+
+    "PCPK" | version (u16) | index length (u32) | index | blobs...
+
+Blobs start on BLOB_ALIGNMENT byte boundaries. At runtime AssetPack
+mmaps the file and wraps each blob in a PIL image that reads straight
+from the mapping (Image.frombuffer), so loading an image is an index
+lookup: no inflate, no read() and no copy until arcade uploads the
+texture. The OS pages in only the blobs that are used.
+
+An image whose PNG has changed since the pack was built (different mtime
+and size, or same size but a different hash) is loaded from the PNG
+instead, as is anything missing from the pack, or everything if there is
+no pack at all.
+"""
+# Standard Library
+import argparse
+from fnmatch import fnmatch
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
+import struct
+import threading
+
+# Third Party
+import PIL.Image
+import PIL.ImageOps
+
+# Local
+from .atlas import MIRRORED_PATTERNS
+from .hitboxes import file_hash
+
+PACK_NAME = "assets.pack"
+PACK_MAGIC = b"PCPK"
+PACK_VERSION = 1
+
+# Blob offsets are multiples of this
+BLOB_ALIGNMENT = 64
+
+_HEADER = struct.Struct("<4sHI")
+
+
+def _aligned(offset):
+    return -(-offset // BLOB_ALIGNMENT) * BLOB_ALIGNMENT
+
+
+def build_pack(img_dir, pack_path):
+    '''
+    Decode every image under img_dir into one pack file at pack_path.
+    Returns the index.
+    '''
+    img_dir, pack_path = Path(img_dir), Path(pack_path)
+
+    entries = {}
+    blobs = []
+    offset = 0
+    for source in sorted(img_dir.glob("**/*.png")):
+        name = source.relative_to(img_dir).as_posix()
+        source_bytes = source.read_bytes()
+        stat = source.stat()
+        image = PIL.Image.open(source).convert("RGBA")
+
+        entry = entries[name] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha1": hashlib.sha1(source_bytes).hexdigest(),
+        }
+        variants = [("normal", image)]
+        if any(fnmatch(name, pattern) for pattern in MIRRORED_PATTERNS):
+            variants.append(("mirrored", PIL.ImageOps.mirror(image)))
+
+        for variant, variant_image in variants:
+            pixels = variant_image.tobytes()
+            entry[variant] = [offset, variant_image.width,
+                              variant_image.height]
+            blobs.append((offset, pixels))
+            offset = _aligned(offset + len(pixels))
+
+    index = json.dumps({"images": entries}, sort_keys=True).encode("utf-8")
+    # Blob offsets in the index are relative to the first blob
+    base = _aligned(_HEADER.size + len(index))
+
+    pack_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = pack_path.with_suffix(".tmp")
+    with open(temp_path, "wb") as pack_file:
+        pack_file.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(index)))
+        pack_file.write(index)
+        for blob_offset, pixels in blobs:
+            pack_file.seek(base + blob_offset)
+            pack_file.write(pixels)
+    os.replace(temp_path, pack_path)
+
+    return entries
+
+
+class AssetPack():
+    '''
+    Images from a pack file, falling back to the loose PNGs.
+
+    Opening the pack is deferred to the first lookup. Images from the pack
+    are read-only views of the mapping; transforms (mirror, crop) give
+    ordinary copies as usual.
+    '''
+    def __init__(self, pack_path, img_dir):
+        self.pack_path = Path(pack_path)
+        self.img_dir = Path(img_dir)
+
+        self.entries = None
+        self.mapping = None
+        self.base = 0
+        # Rooms decode on worker threads, so opening needs a lock
+        self.lock = threading.Lock()
+        # Names checked against their PNG: entry, or None if stale
+        self.fresh = {}
+
+    def _open(self):
+        """ Map the pack. Without a usable one, nothing is packed. """
+        try:
+            entries, self.mapping, self.base = self._map()
+        except (OSError, ValueError, KeyError, struct.error):
+            entries = {}
+        # Set last; other threads only look at the mapping once it is
+        self.entries = entries
+
+    def _map(self):
+        with open(self.pack_path, "rb") as pack_file:
+            magic, version, index_size = _HEADER.unpack(
+                pack_file.read(_HEADER.size))
+            if magic != PACK_MAGIC or version != PACK_VERSION:
+                raise ValueError(f"{self.pack_path} is not a version "
+                                 f"{PACK_VERSION} asset pack")
+            index = json.loads(pack_file.read(index_size))
+            # The mapping stays valid after the file is closed
+            mapping = mmap.mmap(pack_file.fileno(), 0,
+                                access=mmap.ACCESS_READ)
+        return index["images"], mapping, _aligned(_HEADER.size + index_size)
+
+    def _relative_name(self, filename):
+        try:
+            return Path(filename).relative_to(self.img_dir).as_posix()
+        except ValueError:
+            return None
+
+    def entry(self, filename):
+        """ filename's index entry, or None if unpacked or out of date. """
+        if self.entries is None:
+            with self.lock:
+                if self.entries is None:
+                    self._open()
+        name = self._relative_name(filename)
+        if name is None:
+            return None
+        if name in self.fresh:
+            return self.fresh[name]
+
+        entry = self.entries.get(name)
+        if entry is not None:
+            try:
+                stat = os.stat(self.img_dir / name)
+            except OSError:
+                # Packed but not shipped loose; the pack is all there is
+                stat = None
+            if stat is not None and stat.st_mtime != entry["mtime"]:
+                # Touched, but maybe not changed
+                if (stat.st_size != entry["size"] or
+                        file_hash(self.img_dir / name) != entry["sha1"]):
+                    entry = None
+        self.fresh[name] = entry
+        return entry
+
+    def lookup(self, filename, mirrored=False):
+        '''
+        (image, content hash) for filename from the pack, or None. For
+        mirrored, None also when the mirror image was not packed.
+        '''
+        entry = self.entry(filename)
+        if entry is None:
+            return None
+        rect = entry.get("mirrored" if mirrored else "normal")
+        if rect is None:
+            return None
+        offset, width, height = rect
+        start = self.base + offset
+        pixels = memoryview(self.mapping)[start:start + width * height * 4]
+        image = PIL.Image.frombuffer(
+            "RGBA", (width, height), pixels, "raw", "RGBA", 0, 1)
+        return image, entry["sha1"]
+
+    def image(self, filename):
+        """ filename as RGBA, from the pack if it can be, else the PNG. """
+        packed = self.lookup(filename)
+        if packed is not None:
+            return packed[0]
+        return PIL.Image.open(filename).convert("RGBA")
+
+
+def main():
+    """ Build the asset pack for the game's resources. """
+    project = Path(os.path.dirname(__file__))
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--img", default=project / "resources" / "img",
+                        type=Path, help="image directory to pack")
+    parser.add_argument("--out", default=project / "resources" / PACK_NAME,
+                        type=Path, help="pack file to write")
+    args = parser.parse_args()
+
+    entries = build_pack(args.img, args.out)
+    print(f"Packed {len(entries)} images into {args.out} "
+          f"({args.out.stat().st_size / 2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Startup asset loading.
+
+Setting up the window used to decode every image it needed on the main
+thread, one PNG after another: player frames and their mirror images,
+cursors, arrows, and the first room's background and items, all before the
+first frame could be drawn.
+
+AssetLoader reads resources/preload.json, which lists the images and
+animation clips the game needs before it is playable, adds the first
+room's background and item images, and decodes the lot on a thread pool.
+PIL releases the GIL while it decompresses, so the decodes really do run
+side by side. Results come back to the main thread through poll(), which
+the window calls once a frame while it draws a progress bar. Each image is
+installed into the texture atlas there and made into its arcade Textures,
+a few per frame, so the progress screen keeps drawing. When the loader has
+finished, the rest of setup finds every texture it asks for cached.
+"""
+# Standard Library
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import json
+import os
+from time import perf_counter, sleep
+
+# Third Party
+import PIL.Image
+
+# Main-thread time poll() may spend installing results each frame
+POLL_SECONDS = 1 / 120
+
+MAX_WORKERS = 8
+
+
+def decode_image(filename, pack=None):
+    """
+    Read and decode filename, with its content hash for hit boxes. An
+    asset pack that has it already decoded hands it over instead.
+    """
+    if pack is not None:
+        packed = pack.lookup(filename)
+        if packed is not None:
+            return packed
+    with open(filename, "rb") as image_file:
+        data = image_file.read()
+    image = PIL.Image.open(io.BytesIO(data)).convert("RGBA")
+    return image, hashlib.sha1(data).hexdigest()
+
+
+class AssetLoader():
+    '''
+    Decodes the startup images in parallel and installs them on the main
+    thread, as they arrive.
+
+    rooms are Rooms to load as well: their backgrounds, and their items'
+    images so the items are quick to create when the room is entered.
+    '''
+    def __init__(self, manifest_path, textures, animations, rooms=(),
+                 workers=None):
+        self.manifest_path = manifest_path
+        self.textures = textures
+        self.animations = animations
+        self.rooms = list(rooms)
+        self.workers = workers or min(MAX_WORKERS, os.cpu_count() or 1)
+
+        self.executor = None
+        # (install, future) pairs, appended by worker threads
+        self.arrived = deque()
+        # Main-thread steps that wait until every decode is installed
+        self.final_steps = deque()
+        self.total = 0
+        self.installed = 0
+
+        self.started = None
+        self.elapsed = None
+
+    def _images(self, manifest):
+        '''
+        {filename: mirrored} for every image to load, where mirrored says
+        whether its mirror image is needed too.
+        '''
+        img_dir = self.animations.img_dir
+        images = {}
+        for name in manifest.get("images", []):
+            images[img_dir / name] = False
+        for clip in manifest.get("clips", []):
+            data = self.animations.definition(clip)
+            for name in data["frames"]:
+                filename = img_dir / name
+                images[filename] = (images.get(filename, False) or
+                                    data.get("mirrored", False))
+        for room in self.rooms:
+            for filename in room.item_images:
+                images.setdefault(filename, False)
+        return images
+
+    def start(self):
+        """ Submit every decode. Call from the main thread. """
+        self.started = perf_counter()
+        with open(self.manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        images = self._images(manifest)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="preload")
+
+        # Packed images come out of their sheet; one decode per sheet
+        by_sheet = {}
+        for filename, mirrored in images.items():
+            sheets = self.textures.sheet_indices(filename, mirrored)
+            if not sheets:
+                self._submit(self._install_image(filename, mirrored),
+                             decode_image, filename, self.textures.pack)
+            for index in sheets:
+                by_sheet.setdefault(index, {})[filename] = mirrored
+        for index, sheet_images in by_sheet.items():
+            self._submit(self._install_sheet(index, sheet_images),
+                         self.textures.decode_sheet, index)
+
+        for room in self.rooms:
+            self._submit(self._install_room(room), room.decode)
+            # Plus loading it, once it has arrived
+            self.total += 1
+
+        for clip in manifest.get("clips", []):
+            self.final_steps.append(
+                lambda clip=clip: self.animations.clip(clip))
+        self.total += len(self.final_steps)
+
+    def _submit(self, install, function, *args):
+        self.total += 1
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(
+            lambda future: self.arrived.append((install, future)))
+
+    def _make_textures(self, images):
+        for filename, mirrored in images.items():
+            self.textures.texture(filename)
+            if mirrored:
+                self.textures.texture(filename, mirrored=True)
+
+    def _install_image(self, filename, mirrored):
+        def install(result):
+            image, content_hash = result
+            self.textures.preload(filename, image, content_hash)
+            self._make_textures({filename: mirrored})
+        return install
+
+    def _install_sheet(self, index, images):
+        def install(image):
+            self.textures.install_sheet(index, image)
+            self._make_textures(images)
+        return install
+
+    def _install_room(self, room):
+        def install(texture):
+            # Built on the main thread with the other final steps
+            self.final_steps.appendleft(lambda: room.load(texture))
+        return install
+
+    @property
+    def finished(self):
+        return self.started is not None and self.installed == self.total
+
+    @property
+    def progress(self):
+        """ Fraction of the work done, 0 to 1. """
+        return self.installed / self.total if self.total else 1.0
+
+    def poll(self, budget=POLL_SECONDS):
+        '''
+        Install whatever has been decoded, for up to budget seconds.
+        Returns True once everything is in.
+        '''
+        deadline = perf_counter() + budget
+        while perf_counter() < deadline:
+            if self.arrived:
+                install, future = self.arrived.popleft()
+                install(future.result())
+            elif (self.final_steps and
+                  self.installed == self.total - len(self.final_steps)):
+                self.final_steps.popleft()()
+            else:
+                break
+            self.installed += 1
+
+        if self.finished and self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+            # Every texture that needed them has been made
+            self.textures.decoded.clear()
+            self.elapsed = perf_counter() - self.started
+        return self.finished
+
+    def run(self):
+        """ Start and install everything, blocking until it is done. """
+        self.start()
+        while not self.poll(budget=1):
+            sleep(0.001)
@@ -0,0 +1,172 @@
+"""
+Frame-phase profiler.
+
+Wrap a phase of the frame in a named scope:
+
+    with profiler.scope("draw.world"):
+        self.level_sprites.draw()
+
+While the profiler is enabled each scope's duration goes into a fixed-size
+ring buffer per phase (for p50/p95/p99) and into one shared ring of raw
+events, which can be written out as a Chrome trace (chrome://tracing or
+ui.perfetto.dev) or as CSV. While it is disabled, scope() hands back a
+shared do-nothing context manager, so instrumented code costs one method
+call and an empty with-block per scope.
+"""
+# Standard Library
+import csv
+import json
+from time import perf_counter
+
+# Durations kept per phase for percentiles, about ten seconds at 60 FPS
+PHASE_HISTORY = 600
+
+# Raw events kept for trace export
+TRACE_HISTORY = 16384
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+class RingBuffer():
+    '''
+    The last capacity values appended, in a preallocated list.
+    '''
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.values = [None] * capacity
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, value):
+        self.values[self.count % self.capacity] = value
+        self.count += 1
+
+    def recent(self):
+        """ Values still held, oldest first. """
+        if self.count <= self.capacity:
+            return self.values[:self.count]
+        split = self.count % self.capacity
+        return self.values[split:] + self.values[:split]
+
+    def clear(self):
+        self.values = [None] * self.capacity
+        self.count = 0
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank
+    index = max(0, min(len(sorted_values) - 1,
+                       int(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class _NullScope():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SCOPE = _NullScope()
+
+
+class _Scope():
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, perf_counter())
+        return False
+
+
+class Profiler():
+    '''
+    Named timing scopes, kept in ring buffers.
+    '''
+    def __init__(self, phase_history=PHASE_HISTORY,
+                 trace_history=TRACE_HISTORY):
+        self.enabled = False
+        self.phase_history = phase_history
+
+        self.phases = {}
+        self.events = RingBuffer(trace_history)
+
+        # Trace timestamps are relative to this
+        self.epoch = perf_counter()
+
+    def scope(self, name):
+        if not self.enabled:
+            return _NULL_SCOPE
+        return _Scope(self, name)
+
+    def record(self, name, start, end):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = RingBuffer(self.phase_history)
+        phase.append(end - start)
+        self.events.append((name, start, end))
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def clear(self):
+        self.phases = {}
+        self.events.clear()
+
+    def stats(self):
+        """
+        {phase: (p50, p95, p99, samples)} with times in milliseconds, in
+        the order phases were first seen.
+        """
+        stats = {}
+        for name, phase in self.phases.items():
+            durations = sorted(phase.recent())
+            if not durations:
+                continue
+            stats[name] = tuple(
+                percentile(durations, fraction) * 1000
+                for fraction in PERCENTILES) + (len(durations),)
+        return stats
+
+    def summary(self):
+        """ The stats as a small text table, for the overlay. """
+        lines = [f"{'phase':<16}{'p50':>8}{'p95':>8}{'p99':>8}  ms"]
+        for name, (p50, p95, p99, _) in self.stats().items():
+            lines.append(f"{name:<16}{p50:>8.2f}{p95:>8.2f}{p99:>8.2f}")
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, filename):
+        """ Write the recent events in Chrome's trace event format. """
+        trace_events = [{
+            "name": name,
+            "cat": name.split(".")[0],
+            "ph": "X",
+            "ts": (start - self.epoch) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": 0,
+            "tid": 0,
+        } for name, start, end in self.events.recent()]
+
+        with open(filename, "w") as trace_file:
+            json.dump({"traceEvents": trace_events,
+                       "displayTimeUnit": "ms"}, trace_file)
+
+    def export_csv(self, filename):
+        """ Write the recent events as phase, start and duration in µs. """
+        with open(filename, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["phase", "start_us", "duration_us"])
+            for name, start, end in self.events.recent():
+                writer.writerow([name, round((start - self.epoch) * 1e6, 1),
+                                 round((end - start) * 1e6, 1)])
@@ -0,0 +1,203 @@
+"""
+Input recording and replay.
+
+Run the game with --record to log every mouse move, mouse release and key
+press along with the simulation tick it arrived on:
+
+    python -m arcade-pointandclick --record run.rec --seed 7
+
+A log is a short header (with the seed the run used) followed by one
+fixed-size record per event, and ends with the tick the run stopped on
+and a hash of the final save snapshot. Replaying feeds the events back
+through a headless GameCore, one fixed step at a time and as fast as it
+will go, then checks the game finished in the same state:
+
+    python -m arcade-pointandclick.replay run.rec
+
+The tick is the clock's step count, so events land between the same two
+simulation steps they did live. Random item placement comes from the seed.
+"""
+# Standard Library
+import argparse
+import hashlib
+from pathlib import Path
+from statistics import mean
+import struct
+import tempfile
+import time
+
+# Local
+from .core import GameCore, log
+from .profiler import percentile
+
+REPLAY_MAGIC = b"PCRP"
+REPLAY_VERSION = 1
+
+# Event kinds
+MOTION = 0
+RELEASE = 1
+KEY = 2
+END = 3
+
+_HEADER = struct.Struct("<4sHQ")
+# tick, kind, x, y, button or key
+_EVENT = struct.Struct("<IBhhI")
+_DIGEST_SIZE = hashlib.sha1().digest_size
+
+
+class ReplayError(Exception):
+    pass
+
+
+def state_digest(core):
+    """ A hash of everything a save game would hold. """
+    return hashlib.sha1(core.saves.snapshot()).digest()
+
+
+class Recorder():
+    '''
+    Appends input events for a GameCore to a log file as they happen.
+    '''
+    def __init__(self, filename, core):
+        self.core = core
+        self.file = open(filename, "wb")
+        self.file.write(_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, core.seed))
+
+    def event(self, kind, x=0, y=0, value=0, tick=None):
+        """ Log an event of any kind, on the current tick by default. """
+        if tick is None:
+            tick = self.core.clock.steps
+        self.file.write(_EVENT.pack(tick, kind, int(x), int(y), value))
+
+    def motion(self, x, y):
+        self.event(MOTION, x, y)
+
+    def release(self, x, y, button):
+        self.event(RELEASE, x, y, button)
+
+    def key(self, key):
+        self.event(KEY, value=key)
+
+    def finish(self):
+        """ Write the end marker and final state, and close the log. """
+        if self.file.closed:
+            return
+        self.event(END)
+        self.file.write(state_digest(self.core))
+        self.file.close()
+
+
+def read_log(filename):
+    '''
+    Parse a log into (seed, events, end), where events is a list of
+    (tick, kind, x, y, value) and end is (tick, digest), or None if the run
+    never finished (a crash, say).
+    '''
+    with open(filename, "rb") as log_file:
+        data = log_file.read()
+
+    magic, version, seed = _HEADER.unpack_from(data)
+    if magic != REPLAY_MAGIC:
+        raise ReplayError(f"{filename} is not a replay log")
+    if version != REPLAY_VERSION:
+        raise ReplayError(f"{filename} is replay version {version}, "
+                          f"expected {REPLAY_VERSION}")
+
+    events = []
+    end = None
+    offset = _HEADER.size
+    while offset + _EVENT.size <= len(data):
+        event = _EVENT.unpack_from(data, offset)
+        offset += _EVENT.size
+        if event[1] == END:
+            end = (event[0], data[offset:offset + _DIGEST_SIZE])
+            break
+        events.append(event)
+    return seed, events, end
+
+
+def headless_core(seed, prefix="replay-"):
+    """ A set-up GameCore with no window, saving to a temporary folder. """
+    core = GameCore(seed=seed)
+    # Quick saves made during the run go somewhere disposable
+    core.save_dir = Path(tempfile.mkdtemp(prefix=prefix))
+    core.saves.autosave_path = core.save_dir / 'autosave.sav'
+    core.setup()
+    return core
+
+
+def play_event(core, kind, x, y, value):
+    """ Feed one logged event to core, as the window would have. """
+    if kind == MOTION:
+        core.sprite_at(x, y)
+    elif kind == RELEASE:
+        core.click(x, y, value)
+    elif kind == KEY:
+        core.key_press(value)
+
+
+def replay(filename, check=True):
+    '''
+    Run a log through a headless GameCore. Returns (core, tick_times,
+    checked), with the seconds each tick took, events included. Raises
+    ReplayError if the final state doesn't match the recording.
+    '''
+    seed, events, end = read_log(filename)
+    last_tick = end[0] if end else (events[-1][0] if events else 0)
+
+    core = headless_core(seed)
+
+    tick_times = []
+    index = 0
+    while True:
+        start = time.perf_counter()
+        tick = core.clock.steps
+        while index < len(events) and events[index][0] <= tick:
+            play_event(core, *events[index][1:])
+            index += 1
+
+        if tick >= last_tick:
+            tick_times.append(time.perf_counter() - start)
+            break
+        core.step()
+        tick_times.append(time.perf_counter() - start)
+
+    core.saves.wait()
+    checked = check and end is not None
+    if checked and state_digest(core) != end[1]:
+        raise ReplayError(f"{filename} finished in a different state "
+                          f"after {core.clock.steps} ticks")
+    return core, tick_times, checked
+
+
+def main():
+    """ Replay a log and print per-tick timings. """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("log", help="log written by --record")
+    parser.add_argument("--no-check", action="store_true",
+                        help="don't compare the final state")
+    parser.add_argument("--events", metavar="FILE",
+                        help="write the replayed game's events as JSON lines")
+    parser.add_argument("--event-level", default="info", metavar="LEVELS",
+                        help="e.g. info or info,inventory=debug")
+    args = parser.parse_args()
+
+    if args.events is not None:
+        log.open(args.events, args.event_level)
+
+    start = time.perf_counter()
+    core, tick_times, checked = replay(args.log, check=not args.no_check)
+    elapsed = time.perf_counter() - start
+
+    ticks = sorted(tick_times)
+    print(f"{len(ticks)} ticks ({len(ticks) * core.clock.step:.1f} s of "
+          f"game time) in {elapsed:.2f} s")
+    print(f"per tick (ms): mean {mean(ticks) * 1000:.3f}  "
+          f"p50 {percentile(ticks, 0.5) * 1000:.3f}  "
+          f"p95 {percentile(ticks, 0.95) * 1000:.3f}  "
+          f"max {ticks[-1] * 1000:.3f}")
+    print("final state matches" if checked else "final state not checked")
+
+
+if __name__ == "__main__":
+    main()
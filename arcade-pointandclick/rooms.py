@@ -0,0 +1,99 @@
+"""
+Lazy room loading.
+
+Rooms no longer decode their background when they are created. RoomCache
+loads the room the player is in, decodes its connected rooms on a worker
+thread while the player is busy elsewhere, and unloads the least recently
+visited rooms once their decoded backgrounds go over a memory budget.
+"""
+# Standard Library
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+# 64 MiB is about eight 1080p RGBA backgrounds
+ROOM_MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+class RoomCache():
+    '''
+    Decides which rooms are resident.
+
+    Rooms only need decode() (safe on any thread), load(decoded),
+    load_items() and unload() (main thread), a loaded flag, texture_bytes
+    and connected_rooms. Everything except decode() happens on the main thread,
+    so rooms never need locking.
+    '''
+    def __init__(self, budget=ROOM_MEMORY_BUDGET, workers=1):
+        self.budget = budget
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        self.current = None
+        self.last_visit = {}
+        self.pending = {}
+
+    @property
+    def resident_bytes(self):
+        return sum(room.texture_bytes for room in self.last_visit
+                   if room.loaded)
+
+    def enter(self, room):
+        """
+        Make room the current room, loading it now if it has to be, and
+        start prefetching its neighbours.
+        """
+        self.poll()
+
+        if not room.loaded:
+            future = self.pending.pop(room, None)
+            # Wait for a prefetch already in flight rather than decoding twice
+            room.load(future.result() if future else room.decode())
+        # Only now, not when a prefetch lands: items are game state, and
+        # which exist mustn't depend on how fast the worker was
+        room.load_items()
+
+        self.current = room
+        self.last_visit[room] = time.monotonic()
+
+        for neighbour in room.connected_rooms:
+            self.prefetch(neighbour)
+
+        self.evict()
+
+    def prefetch(self, room):
+        if room.loaded or room in self.pending:
+            return
+        self.pending[room] = self.executor.submit(room.decode)
+
+    def poll(self):
+        """
+        Install any prefetched rooms that finished decoding. Call once a
+        tick from the main thread.
+        """
+        done = [room for room, future in self.pending.items()
+                if future.done()]
+        for room in done:
+            future = self.pending.pop(room)
+            if not room.loaded:
+                room.load(future.result())
+            self.last_visit.setdefault(room, 0)
+
+        if done:
+            self.evict()
+
+    def evict(self):
+        """
+        Unload least recently visited rooms until under budget. Rooms next
+        to the current one go last, since the player may walk into them.
+        """
+        neighbours = self.current.connected_rooms if self.current else ()
+        resident = sorted(
+            (room for room in self.last_visit
+             if room.loaded and room is not self.current),
+            key=lambda room: (room in neighbours, self.last_visit[room]))
+
+        used = self.resident_bytes
+        for room in resident:
+            if used <= self.budget:
+                break
+            used -= room.texture_bytes
+            room.unload()
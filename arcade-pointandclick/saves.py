@@ -0,0 +1,315 @@
+"""
+Save games.
+
+A snapshot is a short header followed by a zlib-compressed run of packed
+structs: the player, one record per item that has been created so far, and
+the inventory's slot order and scroll position, then the interaction flags
+if any are set. Items are identified by (room number, index in the room's
+item list), which the scene file keeps stable.
+
+Autosave is incremental. Each item's record is packed once and kept; only
+items marked dirty (picked up, dropped, moved by the game) are re-packed,
+so building a snapshot is mostly joining cached bytes. Compressing and
+writing happen on a worker thread, and a save that is still being written
+when the next one is due simply makes the next one wait.
+"""
+# Standard Library
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import struct
+import zlib
+
+SAVE_MAGIC = b"PCSV"
+# 2 added interaction flags and used-up items
+SAVE_VERSION = 2
+# Versions this build can still read
+READABLE_VERSIONS = (1, 2)
+
+AUTOSAVE_SECONDS = 10
+
+_HEADER = struct.Struct("<4sH")
+_PLAYER = struct.Struct("<HffB")
+_COUNT = struct.Struct("<I")
+_ITEM = struct.Struct("<HHBff")
+_SLOT = struct.Struct("<HH")
+_FLAG_LENGTH = struct.Struct("<H")
+
+# Where an item is, in its record
+ITEM_IN_WORLD = 0
+ITEM_CARRIED = 1
+ITEM_REMOVED = 2
+
+
+class SaveError(Exception):
+    pass
+
+
+def write_snapshot(filename, body):
+    """ Compress and write a snapshot body, replacing the file atomically. """
+    filename = Path(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = filename.with_suffix(".tmp")
+    with open(temp_path, "wb") as save_file:
+        save_file.write(_HEADER.pack(SAVE_MAGIC, SAVE_VERSION))
+        save_file.write(zlib.compress(body))
+    os.replace(temp_path, filename)
+
+
+def read_snapshot(filename):
+    '''
+    Parse a snapshot into plain data:
+    (player, items, inventory_slots, row_index, flags), where player is
+    (room, x, y, facing), items maps save ids to (state, x, y) with state
+    one of the ITEM_ constants, inventory_slots lists save ids in slot
+    order and flags is a set of interaction flags.
+    '''
+    with open(filename, "rb") as save_file:
+        data = save_file.read()
+
+    try:
+        magic, version = _HEADER.unpack_from(data)
+    except struct.error:
+        raise SaveError(f"{filename} is not a save file")
+    if magic != SAVE_MAGIC:
+        raise SaveError(f"{filename} is not a save file")
+    if version not in READABLE_VERSIONS:
+        raise SaveError(f"{filename} is save version {version}, "
+                        f"expected {SAVE_VERSION}")
+
+    try:
+        body = zlib.decompress(data[_HEADER.size:])
+    except zlib.error as error:
+        raise SaveError(f"{filename} is corrupt: {error}")
+
+    try:
+        return _parse_body(body, version)
+    except (struct.error, UnicodeDecodeError) as error:
+        # Truncated, or garbage that happened to decompress
+        raise SaveError(f"{filename} is corrupt: {error}")
+
+
+def _parse_body(body, version):
+    """ The records of a decompressed snapshot body, see read_snapshot. """
+    offset = 0
+    player = _PLAYER.unpack_from(body, offset)
+    offset += _PLAYER.size
+
+    items = {}
+    count, = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+    for _ in range(count):
+        room, index, state, x, y = _ITEM.unpack_from(body, offset)
+        offset += _ITEM.size
+        items[(room, index)] = (state, x, y)
+
+    row_index, count = struct.unpack_from("<II", body, offset)
+    offset += 8
+    slots = []
+    for _ in range(count):
+        slots.append(_SLOT.unpack_from(body, offset))
+        offset += _SLOT.size
+
+    # Version 1 has no flags; version 2 only has them if any were set
+    flags = set()
+    if version >= 2 and offset < len(body):
+        count, = _COUNT.unpack_from(body, offset)
+        offset += _COUNT.size
+        for _ in range(count):
+            length, = _FLAG_LENGTH.unpack_from(body, offset)
+            offset += _FLAG_LENGTH.size
+            flags.add(body[offset:offset + length].decode("utf-8"))
+            offset += length
+
+    return player, items, slots, row_index, flags
+
+
+class SaveGames():
+    '''
+    Builds snapshots of a GameCore and writes them in the background.
+
+    The core calls mark_dirty(item) whenever an item's saved state
+    changes; the player and inventory are small and packed every time.
+    '''
+    def __init__(self, core, autosave_path=None,
+                 interval=AUTOSAVE_SECONDS):
+        self.core = core
+        self.autosave_path = autosave_path
+        self.interval = interval
+        self.timer = interval
+
+        self.records = {}
+        self.dirty = set()
+        self.changed = False
+        # Rooms whose items already have records
+        self.recorded_rooms = set()
+        self.saved_player = None
+
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+
+    def mark_dirty(self, item=None):
+        """ Note that item (or just the player/inventory) needs saving. """
+        if item is not None:
+            self.dirty.add(item)
+        self.changed = True
+
+    def _item_records(self):
+        # Rooms create their items the first time they load
+        for room in self.core.rooms:
+            if room.items_loaded and room not in self.recorded_rooms:
+                self.recorded_rooms.add(room)
+                self.dirty.update(room.items)
+
+        for item in self.dirty:
+            save_id = getattr(item, "save_id", None)
+            if save_id is None:
+                continue
+            if item.removed:
+                state = ITEM_REMOVED
+            elif item.IN_INVENTORY:
+                state = ITEM_CARRIED
+            else:
+                state = ITEM_IN_WORLD
+            self.records[save_id] = _ITEM.pack(
+                save_id[0], save_id[1], state, *self._world_position(item))
+        self.dirty.clear()
+        return self.records
+
+    def _world_position(self, item):
+        # Carried items sit in an inventory slot; where they were picked up
+        # from is what the world needs back
+        return item.world_position or item.position
+
+    def _player_record(self):
+        player = self.core.player_sprite
+        return _PLAYER.pack(self.core.room.number, player.center_x,
+                            player.center_y, player.character_face_direction)
+
+    def snapshot(self):
+        """ The uncompressed snapshot body, packed incrementally. """
+        core = self.core
+        records = self._item_records()
+
+        slots = [item.save_id for item in core.inventory.items
+                 if getattr(item, "save_id", None) is not None]
+
+        self.saved_player = self._player_record()
+        parts = [
+            self.saved_player,
+            _COUNT.pack(len(records)),
+            # In save id order, so the same game always packs the same bytes
+            b"".join(records[save_id] for save_id in sorted(records)),
+            struct.pack("<II", core.inventory.row_index, len(slots)),
+            b"".join(_SLOT.pack(*save_id) for save_id in slots),
+        ]
+
+        flags = sorted(core.interactions.flags)
+        if flags:
+            parts.append(_COUNT.pack(len(flags)))
+            for flag in flags:
+                encoded = flag.encode("utf-8")
+                parts.append(_FLAG_LENGTH.pack(len(encoded)))
+                parts.append(encoded)
+        return b"".join(parts)
+
+    def save(self, filename):
+        """
+        Snapshot now and write it on the worker thread. Returns a future.
+        """
+        body = self.snapshot()
+        self.changed = False
+        self.pending = self.executor.submit(write_snapshot, filename, body)
+        return self.pending
+
+    @property
+    def writing(self):
+        """ Whether a save is still being written. """
+        return self.pending is not None and not self.pending.done()
+
+    def wait(self):
+        """ Block until the last save has been written. """
+        if self.pending is not None:
+            self.pending.result()
+
+    def tick(self, delta_time):
+        """ Autosave every interval seconds, if anything changed. """
+        if self.autosave_path is None:
+            return
+        self.timer -= delta_time
+        if self.timer > 0:
+            return
+        self.timer = self.interval
+
+        if self.writing:
+            # Still writing the last one; try again next interval
+            return
+        if self.changed or self._player_record() != self.saved_player:
+            self.save(self.autosave_path)
+
+    def load(self, filename):
+        """
+        Put the core back into the state saved in filename. Items come
+        back as the same sprites, so no textures are decoded again.
+        """
+        player, items, slots, row_index, flags = read_snapshot(filename)
+        core = self.core
+
+        rooms = core.rooms_by_number
+        # Check before touching anything, a save from another scene mustn't
+        # leave the game half loaded
+        room_number, player_x, player_y, facing = player
+        if room_number not in rooms:
+            raise SaveError(f"{filename} is from a different scene "
+                            f"(no room {room_number})")
+
+        by_id = {}
+        for room_number in {save_id[0] for save_id in items}:
+            room = rooms.get(room_number)
+            if room is None:
+                continue
+            room.load_items()
+            for item in room.items:
+                save_id = getattr(item, "save_id", None)
+                if save_id is not None:
+                    by_id[save_id] = item
+
+        for save_id, (state, x, y) in items.items():
+            item = by_id.get(save_id)
+            if item is None:
+                continue
+            in_inventory = state == ITEM_CARRIED
+            item.IN_INVENTORY = in_inventory
+            item.removed = state == ITEM_REMOVED
+            item.world_position = (x, y) if in_inventory else None
+            item.set_position(x, y)
+
+        # Anything picked up or used up since, from a room the save never
+        # saw, goes back
+        for room in core.rooms:
+            for item in room.items:
+                save_id = getattr(item, "save_id", None)
+                if save_id in items:
+                    continue
+                item.removed = False
+                if item.IN_INVENTORY:
+                    item.IN_INVENTORY = False
+                    item.set_position(*self._world_position(item))
+                    item.world_position = None
+
+        core.interactions.restore(flags)
+        # Whatever was held may not be carried in the loaded game
+        core.reset_cursor()
+
+        core.inventory.restore(
+            [by_id[save_id] for save_id in map(tuple, slots)
+             if save_id in by_id], row_index)
+
+        core.change_room(rooms[room_number], (player_x, player_y))
+        core.player_sprite.character_face_direction = facing
+
+        # Re-pack everything from the restored state next time
+        self.records = {}
+        self.recorded_rooms = set()
+        self.dirty.clear()
+        self.changed = False
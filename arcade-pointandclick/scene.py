@@ -0,0 +1,229 @@
+"""
+Declarative scene description and its compiled cache.
+
+Rooms, their items, walkable areas and transitions are described in
+resources/scenes/scene.json. Compiling it opens every referenced image once
+to precompute scaled sizes and hit boxes, builds each room's navmesh from
+its walkable polygon and obstacles, and writes the result as a
+pickled tuple-of-tuples cache next to the source. The game loads the cache
+at startup, so placing items costs no JSON parsing and no PIL work; the
+cache is rebuilt automatically when the JSON or any image it used changes.
+
+Compile by hand with:
+
+    python -m arcade-pointandclick.scene
+"""
+# Standard Library
+from collections import namedtuple
+import hashlib
+import json
+import os
+from pathlib import Path
+import pickle
+
+# Third Party
+import PIL.Image
+import arcade
+
+# Local
+from .navmesh import build_navmesh
+
+SCENE_CACHE_VERSION = 2
+SCENE_CACHE_SUFFIX = ".cache"
+
+INFINITY = float("inf")
+
+ItemSpec = namedtuple("ItemSpec", [
+    "name", "image", "scale", "description",
+    "position", "random_position", "can_be_picked_up", "z_index",
+    "width", "height", "hit_box",
+])
+
+TransitionSpec = namedtuple("TransitionSpec", [
+    "to", "area", "player_position",
+])
+
+RoomSpec = namedtuple("RoomSpec", [
+    "name", "number", "background", "scale", "player_scale",
+    "walkable", "walkable_bounds", "obstacles", "navmesh",
+    "connected", "transitions", "items",
+])
+
+
+def _bounds(points):
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def _area(area):
+    # null edges in the JSON mean "open on that side"
+    left, bottom, right, top = area
+    return (
+        -INFINITY if left is None else left,
+        -INFINITY if bottom is None else bottom,
+        INFINITY if right is None else right,
+        INFINITY if top is None else top,
+    )
+
+
+class SceneCompiler():
+    '''
+    Turns the JSON scene description into plain tuples.
+
+    Image sizes and hit boxes are computed once per image file, with hit
+    boxes taken from hit_boxes (a HitBoxCache) when one is given.
+    '''
+    def __init__(self, img_dir, hit_boxes=None):
+        self.img_dir = Path(img_dir)
+        self.hit_boxes = hit_boxes
+        self.images = {}
+        self.mtimes = {}
+
+    def _image_info(self, name):
+        if name not in self.images:
+            filename = self.img_dir / name
+            # Opening only reads the header; pixels are decoded on demand
+            with PIL.Image.open(filename) as image:
+                width, height = image.size
+                if self.hit_boxes is not None:
+                    points = self.hit_boxes.points(filename)
+                else:
+                    points = arcade.calculate_points(image.convert("RGBA"))
+            points = tuple(tuple(point) for point in points)
+            self.images[name] = (width, height, points)
+            self.mtimes[name] = os.stat(filename).st_mtime
+        return self.images[name]
+
+    def item(self, data):
+        width, height, hit_box = self._image_info(data["image"])
+        scale = data.get("scale", 1)
+        random_position = data.get("random_position")
+        return (
+            data["name"],
+            data["image"],
+            scale,
+            data.get("description", ""),
+            tuple(data.get("position", (0, 0))),
+            tuple(map(tuple, random_position)) if random_position else None,
+            data.get("can_be_picked_up", False),
+            data.get("z_index", 0),
+            width * scale,
+            height * scale,
+            hit_box,
+        )
+
+    def transition(self, data):
+        return (
+            data["to"],
+            _area(data["area"]),
+            tuple(data["player_position"]),
+        )
+
+    def room(self, data):
+        walkable = tuple(tuple(point) for point in data["walkable"])
+        obstacles = tuple(
+            tuple(tuple(point) for point in obstacle)
+            for obstacle in data.get("obstacles", ()))
+        # Background size is only stat'ed for staleness, never decoded here
+        self.mtimes[data["background"]] = os.stat(
+            self.img_dir / data["background"]).st_mtime
+        return (
+            data["name"],
+            data["number"],
+            data["background"],
+            data.get("scale", 1),
+            data.get("player_scale", 1),
+            walkable,
+            _bounds(walkable),
+            obstacles,
+            build_navmesh(walkable, obstacles),
+            tuple(data.get("connected", ())),
+            tuple(self.transition(t) for t in data.get("transitions", ())),
+            tuple(self.item(item) for item in data.get("items", ())),
+        )
+
+    def compile(self, source):
+        return tuple(self.room(room) for room in source["rooms"])
+
+
+def _source_hash(source_bytes):
+    return hashlib.sha1(source_bytes).hexdigest()
+
+
+def compile_scene(source_path, img_dir, cache_path=None, hit_boxes=None):
+    """
+    Compile a scene description and write its cache. Returns the cache
+    contents.
+    """
+    source_path = Path(source_path)
+    cache_path = cache_path or source_path.with_suffix(SCENE_CACHE_SUFFIX)
+
+    source_bytes = source_path.read_bytes()
+    compiler = SceneCompiler(img_dir, hit_boxes)
+    rooms = compiler.compile(json.loads(source_bytes.decode("utf-8")))
+
+    cache = {
+        "version": SCENE_CACHE_VERSION,
+        "source_hash": _source_hash(source_bytes),
+        "mtimes": compiler.mtimes,
+        "rooms": rooms,
+    }
+    with open(cache_path, "wb") as cache_file:
+        pickle.dump(cache, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    return cache
+
+
+def _read_cache(source_path, img_dir, cache_path):
+    try:
+        with open(cache_path, "rb") as cache_file:
+            cache = pickle.load(cache_file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+
+    if cache.get("version") != SCENE_CACHE_VERSION:
+        return None
+    if cache["source_hash"] != _source_hash(Path(source_path).read_bytes()):
+        return None
+    for name, mtime in cache["mtimes"].items():
+        try:
+            if os.stat(Path(img_dir) / name).st_mtime != mtime:
+                return None
+        except OSError:
+            return None
+    return cache
+
+
+def load_scene(source_path, img_dir, cache_path=None, hit_boxes=None):
+    """
+    The scene's rooms as RoomSpecs, from the cache when it is up to date.
+    """
+    source_path = Path(source_path)
+    cache_path = cache_path or source_path.with_suffix(SCENE_CACHE_SUFFIX)
+
+    cache = _read_cache(source_path, img_dir, cache_path)
+    if cache is None:
+        cache = compile_scene(source_path, img_dir, cache_path, hit_boxes)
+
+    rooms = []
+    for room in cache["rooms"]:
+        room = RoomSpec._make(room)
+        rooms.append(room._replace(
+            transitions=tuple(map(TransitionSpec._make, room.transitions)),
+            items=tuple(map(ItemSpec._make, room.items)),
+        ))
+    return rooms
+
+
+def main():
+    """ Compile the game's scene description. """
+    project = Path(os.path.dirname(__file__))
+    source = project / "resources" / "scenes" / "scene.json"
+    cache = compile_scene(source, project / "resources" / "img")
+    items = sum(len(room[-1]) for room in cache["rooms"])
+    print(f"Compiled {len(cache['rooms'])} rooms and {items} items "
+          f"from {source}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,569 @@
+"""
+Automated play-testing.
+
+Runs many headless game sessions side by side, each driven by a bot that
+clicks about at random: walking, heading for items and room exits,
+examining and using things, paging the inventory, saving and loading.
+After every tick an invariant checker looks for broken game state, such as
+a carried item dropping out of the inventory when the room changes:
+
+    python -m arcade-pointandclick.soak
+    python -m arcade-pointandclick.soak --sessions 64 --ticks 36000
+
+Sessions are spread over a process pool. Each one is set up exactly the
+way the game and replays are, and its bot and item placement both come
+from its seed, so a session runs the same way every time. Its input is
+recorded as it goes; the log of any session that crashed or broke an
+invariant is kept, and replays it:
+
+    python -m arcade-pointandclick.replay soak-logs/seed-12.rec
+
+Each kept log is replayed before the session reports, and a log that
+doesn't reproduce the session (its final state, or its crash) is reported
+as a failure of its own.
+
+The report adds up crashes, invariant failures and a histogram of how
+long each tick took (input and simulation, not the checks) across all the
+sessions, with the slowest ticks and what the bot had just done.
+"""
+# Standard Library
+import argparse
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import os
+from pathlib import Path
+import random
+import shutil
+import time
+import traceback
+
+# Third Party
+import arcade
+
+# Local
+from .core import CURSOR_EXAMINE, CURSOR_USE, LOAD_KEY, SAVE_KEY
+from .profiler import PERCENTILES
+from .replay import (KEY, MOTION, RELEASE, Recorder, headless_core,
+                     play_event, replay)
+
+SESSIONS = 16
+# A minute of game time at 60 steps a second
+SESSION_TICKS = 3600
+
+# How often the bot does something, on average
+ACTIONS_PER_SECOND = 4
+
+# Bot actions and how often each is picked, relative to the others
+ACTION_WEIGHTS = {
+    "walk": 20,
+    "approach": 15,
+    "exit": 4,
+    "examine": 15,
+    "use": 25,
+    "page": 8,
+    "click": 10,
+    "save": 1,
+    "load": 1,
+}
+
+# Upper edges of the tick latency buckets, in milliseconds; one more
+# bucket holds everything slower
+LATENCY_BUCKETS_MS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                      16.7, 25, 50, 100, 250)
+
+# Ticks slower than this are a frame the player would see drop
+TICK_BUDGET_MS = 1000 / 60
+
+# Slowest ticks kept per session, and in the report
+SLOWEST_TICKS = 5
+
+# How far off the walkable area the player's feet may be, for rounding
+WALKABLE_SLACK = 1.0
+
+BUTTONS = (arcade.MOUSE_BUTTON_LEFT, arcade.MOUSE_BUTTON_MIDDLE,
+           arcade.MOUSE_BUTTON_RIGHT)
+
+
+class RandomPolicy():
+    '''
+    A bot that plays by clicking at random, seeded so it always makes the
+    same choices in the same game.
+
+    events() picks this tick's input, if any, as (kind, x, y, value)
+    tuples in replay log form, given the state the core is in now. Logs
+    hold whole pixels, so x and y are ints: the game gets exactly what
+    is logged.
+    '''
+    def __init__(self, seed, rate=ACTIONS_PER_SECOND,
+                 weights=ACTION_WEIGHTS):
+        self.rng = random.Random(seed)
+        self.rate = rate
+        self.actions = list(weights)
+        self.weights = list(weights.values())
+
+    def events(self, core):
+        """ (action, events) for this tick, or (None, []) to do nothing. """
+        if self.rng.random() >= self.rate * core.clock.step:
+            return None, []
+        action = self.rng.choices(self.actions, self.weights)[0]
+        events = getattr(self, "_" + action)(core)
+        return action, [(kind, int(x), int(y), value)
+                        for kind, x, y, value in events]
+
+    def _point(self):
+        return self.rng.uniform(0, 800), self.rng.uniform(0, 600)
+
+    def _click(self, core):
+        x, y = self._point()
+        return [(RELEASE, x, y, self.rng.choice(BUTTONS))]
+
+    def _walk_to(self, x, y):
+        return [(RELEASE, x, y, arcade.MOUSE_BUTTON_LEFT)]
+
+    def _walk(self, core):
+        navmesh = core.room.navmesh
+        for _ in range(20):
+            x, y = self._point()
+            if navmesh.contains(x, y):
+                return self._walk_to(x, y)
+        return []
+
+    def _items(self, core, carried=True):
+        items = [sprite for sprite in core.level_sprites
+                 if sprite is not core.player_sprite]
+        if carried:
+            items.extend(core.inventory)
+        return items
+
+    def _approach(self, core):
+        """ Walk up to an item in the room. """
+        items = self._items(core, carried=False)
+        if not items:
+            return self._walk(core)
+        item = self.rng.choice(items)
+        _, point = core.room.navmesh.nearest_point(item.center_x, item.bottom)
+        return self._walk_to(*point) if point is not None else []
+
+    def _exit(self, core):
+        """ Walk into one of the room's transitions. """
+        if not core.room.transitions:
+            return self._walk(core)
+        left, bottom, right, top = self.rng.choice(core.room.transitions).area
+        x = self.rng.uniform(max(left, 0), min(right, 800))
+        y = self.rng.uniform(max(bottom, 0), min(top, 600))
+        _, point = core.room.navmesh.nearest_point(x, y)
+        return self._walk_to(*point) if point is not None else []
+
+    def _on_item(self, core, mode, button):
+        """ Get into cursor mode with button, then click an item. """
+        items = self._items(core)
+        if not items:
+            return self._click(core)
+        item = self.rng.choice(items)
+        # Near the middle, but not always dead on it
+        x = item.center_x + self.rng.uniform(-0.25, 0.25) * item.width
+        y = item.center_y + self.rng.uniform(-0.25, 0.25) * item.height
+        events = []
+        if core.cursor_mode != mode:
+            events.append((RELEASE, x, y, button))
+        events.append((RELEASE, x, y, arcade.MOUSE_BUTTON_LEFT))
+        return events
+
+    def _examine(self, core):
+        return self._on_item(core, CURSOR_EXAMINE, arcade.MOUSE_BUTTON_RIGHT)
+
+    def _use(self, core):
+        return self._on_item(core, CURSOR_USE, arcade.MOUSE_BUTTON_MIDDLE)
+
+    def _page(self, core):
+        arrow = self.rng.choice(core.inventory_arrows)
+        return [(MOTION, arrow.center_x, arrow.center_y, 0),
+                (RELEASE, arrow.center_x, arrow.center_y,
+                 arcade.MOUSE_BUTTON_LEFT)]
+
+    def _save(self, core):
+        return [(KEY, 0, 0, SAVE_KEY)]
+
+    def _load(self, core):
+        return [(KEY, 0, 0, LOAD_KEY)]
+
+
+class InvariantChecker():
+    '''
+    Checks a GameCore for state that should never happen.
+
+    check() returns a list of (invariant, detail) for whatever is broken.
+    Carried items are remembered from one check to the next, so an item
+    that leaves the inventory without being used up is caught on the tick
+    it happens. Loading a game changes what is carried legitimately;
+    call forget() after one.
+    '''
+    def __init__(self, core):
+        self.core = core
+        self.carried = set()
+
+    def forget(self):
+        self.carried = set()
+
+    def check(self):
+        core = self.core
+        failures = []
+        inventory = core.inventory
+        slotted = set(inventory.slot_of)
+
+        for item in self.carried - slotted:
+            if not item.removed:
+                failures.append(("carried item lost",
+                                 f"{item.name} {item.save_id}"))
+        self.carried = slotted
+
+        for item in slotted:
+            if not item.IN_INVENTORY or item.removed:
+                failures.append(("inventory item not carried",
+                                 f"{item.name} {item.save_id}"))
+        for room in core.rooms:
+            for item in room.items:
+                if item.IN_INVENTORY and item not in slotted:
+                    failures.append(("carried item not in inventory",
+                                     f"{item.name} {item.save_id}"))
+
+        if inventory.carried != Counter(item.name for item in slotted):
+            failures.append(("carried names out of step",
+                             str(dict(inventory.carried))))
+        if len(inventory.items) != len(slotted):
+            failures.append(("item in two slots", str(len(inventory.items))))
+        if not 0 <= inventory.row_index <= max(
+                0, inventory.total_rows - inventory.rows):
+            failures.append(("inventory page out of range",
+                             str(inventory.row_index)))
+
+        room_items = set(core.room.items)
+        player_in_world = False
+        for sprite in core.level_sprites:
+            if sprite is core.player_sprite:
+                player_in_world = True
+            elif sprite not in room_items:
+                failures.append(("item from another room",
+                                 f"{sprite.name} {sprite.save_id}"))
+            elif sprite.IN_INVENTORY or sprite.removed:
+                failures.append(("carried or used item in the world",
+                                 f"{sprite.name} {sprite.save_id}"))
+        if not player_in_world:
+            failures.append(("player not in the world", ""))
+
+        player = core.player_sprite
+        feet = (player.center_x, player.bottom)
+        navmesh = core.room.navmesh
+        if not navmesh.contains(*feet):
+            _, point = navmesh.nearest_point(*feet)
+            if (point is None or
+                    abs(point[0] - feet[0]) + abs(point[1] - feet[1]) >
+                    WALKABLE_SLACK):
+                failures.append(("player off the walkable area",
+                                 f"room {core.room.number} at "
+                                 f"({feet[0]:.1f}, {feet[1]:.1f})"))
+        return failures
+
+
+def latency_bucket(seconds):
+    return bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+
+
+def histogram_percentile(counts, fraction):
+    """ Upper edge (ms) of the bucket holding the fraction-th tick. """
+    rank = fraction * sum(counts)
+    seen = 0
+    for bucket, count in enumerate(counts):
+        seen += count
+        if count and seen >= rank:
+            if bucket < len(LATENCY_BUCKETS_MS):
+                return LATENCY_BUCKETS_MS[bucket]
+            return float("inf")
+    return 0.0
+
+
+def new_result(seed):
+    """ A session's results, before it has run. """
+    return {
+        "seed": seed,
+        "ticks": 0,
+        "actions": Counter(),
+        "rooms": set(),
+        "most carried": 0,
+        "crash": None,
+        "failures": [],
+        "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        "over budget": 0,
+        "slowest": [],
+        "log": None,
+    }
+
+
+def check_log(log_path, crash=None):
+    '''
+    Replay a kept log. Returns None if it reproduces the session: the same
+    final state, or for a crash, the same error. Otherwise says what
+    happened instead.
+    '''
+    try:
+        replay(log_path, check=crash is None)
+    except Exception:
+        error = traceback.format_exc().strip().splitlines()[-1]
+    else:
+        error = None
+    expected = crash[2].strip().splitlines()[-1] if crash else None
+    if error == expected:
+        return None
+    return (f"replay gave {error or 'no error'}, "
+            f"session had {expected or 'no error'}")
+
+
+def run_session(seed, ticks=SESSION_TICKS, log_dir=None,
+                rate=ACTIONS_PER_SECOND):
+    '''
+    Play one seeded session for ticks fixed steps. Returns a dict of
+    plain data (it comes back from a worker process): what the bot did,
+    any crash and invariant failures, and tick timings.
+    '''
+    result = new_result(seed)
+    core = None
+    recorder = None
+    log_path = None
+    if log_dir is not None:
+        Path(log_dir).mkdir(parents=True, exist_ok=True)
+        log_path = Path(log_dir) / f"seed-{seed}.rec"
+    # Each invariant is reported the first time it breaks only
+    broken = set()
+    action = None
+    try:
+        core = headless_core(seed, prefix="soak-")
+        if log_path is not None:
+            recorder = Recorder(log_path, core)
+        checker = InvariantChecker(core)
+        policy = RandomPolicy(seed, rate)
+        histogram = result["histogram"]
+        slowest = []
+
+        for tick in range(ticks):
+            start = time.perf_counter()
+            action, events = policy.events(core)
+            for event in events:
+                if recorder is not None:
+                    recorder.event(*event)
+                play_event(core, *event)
+            core.step()
+            elapsed = time.perf_counter() - start
+
+            result["ticks"] = tick + 1
+            histogram[latency_bucket(elapsed)] += 1
+            if elapsed * 1000 > TICK_BUDGET_MS:
+                result["over budget"] += 1
+            slowest.append((elapsed * 1000, tick, action))
+            if len(slowest) > SLOWEST_TICKS * 4:
+                slowest.sort(reverse=True)
+                del slowest[SLOWEST_TICKS:]
+
+            if action is not None:
+                result["actions"][action] += 1
+            if action == "load":
+                checker.forget()
+            result["rooms"].add(core.room.number)
+            result["most carried"] = max(result["most carried"],
+                                         len(core.inventory.slot_of))
+
+            for invariant, detail in checker.check():
+                if invariant not in broken:
+                    broken.add(invariant)
+                    result["failures"].append(
+                        (invariant, detail, tick, action))
+
+        result["slowest"] = sorted(slowest, reverse=True)[:SLOWEST_TICKS]
+        core.saves.wait()
+    except Exception:
+        result["crash"] = (result["ticks"], action, traceback.format_exc())
+        if recorder is not None:
+            # Mark the tick after the one it died on, so the replay steps
+            # through that tick too
+            recorder.event(MOTION, tick=result["ticks"] + 1)
+            recorder.file.close()
+    finally:
+        if core is not None:
+            shutil.rmtree(core.save_dir, ignore_errors=True)
+
+    if recorder is not None and not recorder.file.closed:
+        recorder.finish()
+    if log_path is not None:
+        if result["crash"] or result["failures"]:
+            result["log"] = str(log_path)
+            detail = check_log(log_path, result["crash"])
+            if detail is not None:
+                result["failures"].append(
+                    ("log does not reproduce", detail, result["ticks"], None))
+        else:
+            log_path.unlink()
+
+    result["rooms"] = sorted(result["rooms"])
+    result["actions"] = dict(result["actions"])
+    return result
+
+
+def run(seeds, ticks=SESSION_TICKS, workers=None, log_dir=None,
+        rate=ACTIONS_PER_SECOND, progress=None):
+    '''
+    Run a session per seed on a process pool. Returns the results in
+    seed order. progress(result) is called as each session finishes.
+    '''
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_session, seed, ticks, log_dir, rate):
+                   seed for seed in seeds}
+        for future in as_completed(futures):
+            seed = futures[future]
+            try:
+                result = future.result()
+            except Exception:
+                # The worker itself died (or the result wouldn't pickle)
+                result = new_result(seed)
+                result["crash"] = (0, None, traceback.format_exc())
+                result["actions"] = {}
+                result["rooms"] = []
+            results[seed] = result
+            if progress is not None:
+                progress(result)
+    return [results[seed] for seed in seeds]
+
+
+def summarize(results):
+    """ Add up session results into one report dict. """
+    histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    actions = Counter()
+    failures = {}
+    slowest = []
+    for result in results:
+        for bucket, count in enumerate(result["histogram"]):
+            histogram[bucket] += count
+        actions.update(result["actions"])
+        for invariant, detail, tick, action in result["failures"]:
+            failures.setdefault(invariant, []).append({
+                "seed": result["seed"], "tick": tick, "action": action,
+                "detail": detail, "log": result["log"]})
+        for milliseconds, tick, action in result["slowest"]:
+            slowest.append({"ms": milliseconds, "seed": result["seed"],
+                            "tick": tick, "action": action})
+    slowest.sort(key=lambda entry: entry["ms"], reverse=True)
+
+    return {
+        "sessions": len(results),
+        "ticks": sum(result["ticks"] for result in results),
+        "actions": dict(actions),
+        "crashes": [{"seed": result["seed"], "tick": result["crash"][0],
+                     "action": result["crash"][1],
+                     "traceback": result["crash"][2], "log": result["log"]}
+                    for result in results if result["crash"]],
+        "failures": failures,
+        "histogram": {
+            "buckets ms": list(LATENCY_BUCKETS_MS),
+            "counts": histogram,
+        },
+        "percentiles ms": {
+            str(fraction): histogram_percentile(histogram, fraction)
+            for fraction in PERCENTILES},
+        "over budget": sum(result["over budget"] for result in results),
+        "slowest": slowest[:SLOWEST_TICKS],
+        "rooms": sorted({room for result in results
+                         for room in result["rooms"]}),
+        "most carried": max((result["most carried"] for result in results),
+                            default=0),
+    }
+
+
+def print_report(report, elapsed):
+    print(f"{report['sessions']} sessions, {report['ticks']} ticks "
+          f"in {elapsed:.1f} s; rooms visited {report['rooms']}, "
+          f"most items carried {report['most carried']}")
+    print("actions: " + ", ".join(
+        f"{action} {count}" for action, count in
+        sorted(report["actions"].items())))
+
+    print(f"\n{len(report['crashes'])} crashed")
+    for crash in report["crashes"]:
+        last_line = crash["traceback"].strip().splitlines()[-1]
+        print(f"  seed {crash['seed']} tick {crash['tick']} after "
+              f"{crash['action']}: {last_line}")
+        if crash["log"]:
+            print(f"    replay: {crash['log']}")
+
+    failing = sum(len(entries) for entries in report["failures"].values())
+    print(f"\n{failing} invariant failures")
+    for invariant, entries in sorted(report["failures"].items()):
+        print(f"  {invariant}: {len(entries)} sessions")
+        for entry in entries[:3]:
+            print(f"    seed {entry['seed']} tick {entry['tick']} after "
+                  f"{entry['action']}: {entry['detail']}")
+            if entry["log"]:
+                print(f"      replay: {entry['log']}")
+
+    counts = report["histogram"]["counts"]
+    total = sum(counts) or 1
+    print("\ntick latency")
+    lower = 0
+    for bucket, count in enumerate(counts):
+        upper = (f"{LATENCY_BUCKETS_MS[bucket]:g}"
+                 if bucket < len(LATENCY_BUCKETS_MS) else "")
+        if count:
+            bar = "#" * max(1, round(40 * count / total))
+            print(f"  {lower:>6g} - {upper:<6} ms {count:>9}  {bar}")
+        lower = LATENCY_BUCKETS_MS[min(bucket, len(LATENCY_BUCKETS_MS) - 1)]
+    print("  " + "  ".join(
+        f"p{float(fraction) * 100:g} <= {milliseconds:g} ms"
+        for fraction, milliseconds in report["percentiles ms"].items()))
+    print(f"  {report['over budget']} ticks over the "
+          f"{TICK_BUDGET_MS:.1f} ms frame budget")
+    for entry in report["slowest"]:
+        print(f"  {entry['ms']:.2f} ms: seed {entry['seed']} "
+              f"tick {entry['tick']} after {entry['action']}")
+
+
+def main():
+    """ Run a soak test and print the report. """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessions", type=int, default=SESSIONS)
+    parser.add_argument("--ticks", type=int, default=SESSION_TICKS,
+                        help="fixed steps per session (60 a second)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="first session's seed; the rest count up")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes (default: one per CPU)")
+    parser.add_argument("--rate", type=float, default=ACTIONS_PER_SECOND,
+                        help="bot actions per second of game time")
+    parser.add_argument("--logs", default="soak-logs", type=Path,
+                        help="where to keep failing sessions' input logs")
+    parser.add_argument("--json", help="also write the report here")
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.sessions)
+    start = time.perf_counter()
+
+    def progress(result):
+        status = ("crashed" if result["crash"] else
+                  "failed" if result["failures"] else "ok")
+        print(f"seed {result['seed']}: {status}", flush=True)
+
+    results = run(seeds, args.ticks, args.workers or os.cpu_count(),
+                  args.logs, args.rate, progress)
+    report = summarize(results)
+    print()
+    print_report(report, time.perf_counter() - start)
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=1)
+
+    if report["crashes"] or report["failures"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Spatial index for pointer hit-testing.
+
+The mouse handlers used to walk every world sprite and rebuild its bounding
+box on every motion event. SpatialHash buckets sprites into a uniform grid
+once, so a pointer query only looks at the handful of sprites sharing the
+cell under the cursor, and only those get the pixel-accurate alpha mask
+test.
+
+Bounds are kept relative to each sprite's position, and sprites are binned
+with some slack around them, so a sprite that walks a few pixels is still
+in the right cells. Batch movers (see actors.py) hand whole crowds over
+with move_sprites(), which only marks them; the cells of any that walked
+out of theirs are fixed on the next query, however many steps later.
+"""
+# Third Party
+import arcade
+import numpy as np
+
+# Local
+from .masks import alpha_masks
+
+HIT_GRID_CELL_SIZE = 64
+
+# How far a sprite can move before it has to be re-binned
+HIT_GRID_SLACK = HIT_GRID_CELL_SIZE // 2
+
+
+def sprite_bounds(sprite):
+    '''
+    Axis-aligned bounds (left, bottom, right, top) of a sprite's hit box.
+    '''
+    points = sprite.get_adjusted_hit_box()
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _cells(cells, exclude=None):
+    '''
+    The (i, j) cells of a (min_i, min_j, max_i, max_j) block that aren't in
+    the exclude block.
+    '''
+    min_i, min_j, max_i, max_j = cells
+    rows = range(min_j, max_j + 1)
+    if exclude is None:
+        return [(i, j) for i in range(min_i, max_i + 1) for j in rows]
+
+    # Columns that overlap the excluded block only keep the rows above and
+    # below it
+    exclude_i = range(exclude[0], exclude[2] + 1)
+    exclude_j = range(exclude[1], exclude[3] + 1)
+    outside = [j for j in rows if j not in exclude_j]
+    return [(i, j) for i in range(min_i, max_i + 1)
+            for j in (outside if i in exclude_i else rows)]
+
+
+class SpatialHash():
+    '''
+    Uniform grid over sprite bounding boxes.
+
+    Implements the same insert_object_for_box/remove_object pair as arcade's
+    own spatial hash, so a SpriteList can hold one of these and sprites will
+    re-bucket themselves only when they actually move or resize.
+    '''
+    def __init__(self, cell_size=HIT_GRID_CELL_SIZE, slack=HIT_GRID_SLACK):
+        self.cell_size = cell_size
+        self.slack = slack
+        self.contents = {}
+
+        # Hit box bounds relative to the sprite's position, so removal
+        # never has to recompute the hit box of a sprite that is mid-move
+        self.extents = {}
+        # (min_i, min_j, max_i, max_j) of the cells each sprite is in
+        self.cells = {}
+        # (min_x, min_y, max_x, max_y) the sprite's position can be in
+        # without its hit box leaving those cells
+        self.ranges = {}
+        # Moved since their cells were last checked
+        self.stale = set()
+
+    def _hash(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def reset(self):
+        self.contents = {}
+        self.extents = {}
+        self.cells = {}
+        self.ranges = {}
+        self.stale = set()
+
+    def insert_object_for_box(self, sprite):
+        if sprite in self.cells:
+            self.remove_object(sprite)
+
+        x, y = sprite.position
+        left, bottom, right, top = sprite_bounds(sprite)
+        self.extents[sprite] = (left - x, bottom - y, right - x, top - y)
+        self._bin(sprite, x, y)
+        self.stale.discard(sprite)
+
+    def _bin(self, sprite, x, y):
+        """ Put a sprite in the cells around (x, y), moving it if binned. """
+        left, bottom, right, top = self.extents[sprite]
+        slack = self.slack
+        min_i, min_j = self._hash(x + left - slack, y + bottom - slack)
+        max_i, max_j = self._hash(x + right + slack, y + top + slack)
+        cells = (min_i, min_j, max_i, max_j)
+
+        # A sprite walking into the next cell only changes a strip of cells
+        old_cells = self.cells.get(sprite)
+        for cell in _cells(cells, old_cells):
+            self.contents.setdefault(cell, set()).add(sprite)
+        if old_cells is not None:
+            self._discard(sprite, _cells(old_cells, cells))
+
+        size = self.cell_size
+        self.cells[sprite] = cells
+        self.ranges[sprite] = (min_i * size - left, min_j * size - bottom,
+                               (max_i + 1) * size - right,
+                               (max_j + 1) * size - top)
+
+    def _discard(self, sprite, cells):
+        for cell in cells:
+            bucket = self.contents[cell]
+            bucket.discard(sprite)
+            if not bucket:
+                del self.contents[cell]
+
+    def _unbin(self, sprite):
+        cells = self.cells.pop(sprite, None)
+        if cells is not None:
+            self._discard(sprite, _cells(cells))
+
+    def remove_object(self, sprite):
+        self._unbin(sprite)
+        self.extents.pop(sprite, None)
+        self.ranges.pop(sprite, None)
+        self.stale.discard(sprite)
+
+    def moved(self, sprites):
+        """
+        Note that sprites have moved, without changing shape. arcade
+        re-inserts sprites whose texture, scale or hit box changes by
+        itself.
+        """
+        self.stale.update(sprites)
+
+    def _refresh(self):
+        # Re-bin whichever moved sprites walked out of their cells
+        ranges = self.ranges
+        for sprite in self.stale:
+            x, y = sprite.position
+            min_x, min_y, max_x, max_y = ranges[sprite]
+            if not (min_x <= x < max_x and min_y <= y < max_y):
+                self._bin(sprite, x, y)
+        self.stale.clear()
+
+    def bounds(self, sprite):
+        """ Where the sprite's hit box is now, (left, bottom, right, top). """
+        x, y = sprite.position
+        left, bottom, right, top = self.extents[sprite]
+        return x + left, y + bottom, x + right, y + top
+
+    def get_objects_for_point(self, point):
+        """ Sprites whose bounding box contains the point. """
+        if self.stale:
+            self._refresh()
+        x, y = point
+        hits = []
+        for sprite in self.contents.get(self._hash(x, y), ()):
+            left, bottom, right, top = self.bounds(sprite)
+            if left <= x < right and bottom <= y < top:
+                hits.append(sprite)
+        return hits
+
+
+def move_sprites(sprites, xs, ys):
+    '''
+    sprite.set_position(x, y) for a crowd at once.
+
+    Each sprite's own position is set directly, and each sprite list
+    holding them is told once about all of them, instead of once per
+    sprite. Only plain moves are allowed: arcade re-indexes sprites whose
+    texture, scale or hit box changes by itself.
+    '''
+    sprite_lists = {}
+    for sprite, x, y in zip(sprites, xs, ys):
+        sprite._position = (x, y)
+        sprite._point_list_cache = None
+        for sprite_list in sprite.sprite_lists:
+            members = sprite_lists.get(sprite_list)
+            if members is None:
+                members = sprite_lists[sprite_list] = ([], [], [])
+            members[0].append(sprite)
+            members[1].append(x)
+            members[2].append(y)
+
+    for sprite_list, (members, member_xs, member_ys) in sprite_lists.items():
+        if isinstance(sprite_list, IndexedSpriteList):
+            sprite_list.update_locations(members, member_xs, member_ys)
+        else:
+            for sprite in members:
+                if sprite_list.use_spatial_hash:
+                    sprite_list.spatial_hash.remove_object(sprite)
+                    sprite_list.spatial_hash.insert_object_for_box(sprite)
+                sprite_list.update_location(sprite)
+
+
+class IndexedSpriteList(arcade.SpriteList):
+    '''
+    SpriteList backed by a SpatialHash, with a topmost-sprite point query.
+    '''
+    def __init__(self, cell_size=HIT_GRID_CELL_SIZE, **kwargs):
+        super().__init__(use_spatial_hash=True, **kwargs)
+        self.spatial_hash = SpatialHash(cell_size)
+
+    def clear(self):
+        """ Drop every sprite from the list (and the index) in one go. """
+        for sprite in self.sprite_list:
+            sprite.sprite_lists.remove(self)
+        self.sprite_list = []
+        self.sprite_idx = dict()
+        self._vao1 = None
+        self.spatial_hash.reset()
+
+    def remove(self, item):
+        super().remove(item)
+        # arcade leaves the removed sprite in the index
+        self.sprite_idx.pop(item, None)
+
+    def update_locations(self, sprites, xs, ys):
+        """ update_location for sprites that have moved to xs, ys. """
+        self.spatial_hash.moved(sprites)
+        if self._vao1 is None:
+            return
+
+        # Write the instance buffer through a numpy view
+        index = np.fromiter(map(self.sprite_idx.__getitem__, sprites),
+                            dtype=np.intp, count=len(sprites))
+        buffer = np.frombuffer(self._sprite_pos_data, dtype=np.float32)
+        positions = buffer.reshape(-1, 2)
+        positions[index, 0] = xs
+        positions[index, 1] = ys
+        self._sprite_pos_changed = True
+
+    def sprites_at(self, x, y):
+        return self.spatial_hash.get_objects_for_point((x, y))
+
+    def sprite_at(self, x, y):
+        """
+        Return the topmost sprite with an opaque pixel under (x, y), or
+        None.
+
+        Topmost is whichever of the hits this list draws last. Bounding
+        boxes reject most sprites; only those left have their alpha mask
+        checked, front to back.
+        """
+        hits = self.sprites_at(x, y)
+        hits.sort(key=self.sprite_idx.__getitem__, reverse=True)
+        for sprite in hits:
+            if alpha_masks.sprite_contains(sprite, x, y):
+                return sprite
+        return None
@@ -0,0 +1,189 @@
+"""
+Cached text rendering.
+
+arcade.draw_text rasterises through PIL and draws its own one-sprite
+SpriteList every call. Here each distinct (text, font size, colour, width,
+alignment) is rendered once into a texture kept in an LRU cache, and all
+on-screen labels share one SpriteList, so steady-state text is a single
+batched draw and changing a label is a dictionary lookup.
+"""
+# Standard Library
+from collections import OrderedDict
+from itertools import chain
+
+# Third Party
+import PIL.Image
+import PIL.ImageDraw
+import PIL.ImageFont
+import arcade
+
+TEXT_CACHE_SIZE = 64
+
+FONT_NAMES = ('calibri', 'arial')
+
+
+def load_font(font_size, font_name=FONT_NAMES):
+    '''
+    First font from font_name (or arcade's defaults) that PIL can open.
+    '''
+    if isinstance(font_name, str):
+        font_name = font_name,
+
+    font_names = chain(*[
+        [name, f"{name}.ttf"] for name in font_name
+    ], arcade.DEFAULT_FONT_NAMES)
+
+    for name in font_names:
+        try:
+            return PIL.ImageFont.truetype(name, int(font_size))
+        except OSError:
+            continue
+
+    raise RuntimeError("Unable to find a default font on this system.")
+
+
+def render_text_image(text, color, font_size, width=0, align="left",
+                      font_name=FONT_NAMES):
+    '''
+    Rasterise text the same way arcade.draw_text does, without drawing it.
+    '''
+    # Match draw_text's sizing, and draw at 2x then shrink to anti-alias
+    scale = 2
+    font_size = font_size * 1.25 * scale
+    font = load_font(font_size, font_name)
+
+    scratch = PIL.Image.new("RGBA", (10, 10))
+    text_width, text_height = PIL.ImageDraw.Draw(scratch).multiline_textsize(
+        text, font=font)
+    # Room for letters that drop below the baseline
+    text_height += int(font_size * 0.25)
+
+    start_x = 0
+    field_width = text_width
+    if width:
+        field_width = width * scale
+        if align == "center":
+            start_x = (field_width - text_width) // 2
+        elif align == "right":
+            start_x = field_width - text_width
+
+    image = PIL.Image.new("RGBA", (field_width, text_height))
+    PIL.ImageDraw.Draw(image).multiline_text(
+        (start_x, 0), text, tuple(color[:3]), align=align, font=font)
+
+    return image.resize(
+        (max(1, field_width // scale), max(1, text_height // scale)),
+        resample=PIL.Image.LANCZOS)
+
+
+class TextCache():
+    '''
+    LRU cache of rendered text textures.
+
+    hits, misses and evictions are kept so the size can be tuned.
+    '''
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self.textures = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Called with each evicted texture
+        self.on_evict = None
+
+    def __len__(self):
+        return len(self.textures)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, text, font_size, color, width=0, align="left"):
+        key = (text, font_size, tuple(color), width, align)
+
+        texture = self.textures.get(key)
+        if texture is not None:
+            self.hits += 1
+            self.textures.move_to_end(key)
+            return texture
+
+        self.misses += 1
+        image = render_text_image(text, color, font_size, width, align)
+        texture = arcade.Texture(f"text:{key}", image)
+        self.textures[key] = texture
+
+        while len(self.textures) > self.max_size:
+            _, evicted = self.textures.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+
+        return texture
+
+
+class Label(arcade.Sprite):
+    '''
+    A line (or block) of text drawn from a TextLayer.
+    '''
+    def __init__(self, layer, font_size=12, width=0, align="left"):
+        super().__init__()
+        self.layer = layer
+        self.font_size = font_size
+        self.field_width = width
+        self.align = align
+
+        self.text = ""
+        self.text_color = None
+
+    def set_text(self, text, color=arcade.color.WHITE):
+        """
+        Change the label, re-using the cached texture where possible.
+        Returns whether anything changed.
+        """
+        if text == self.text and color == self.text_color:
+            return False
+
+        self.text = text
+        self.text_color = color
+
+        visible = bool(text) and (len(color) < 4 or color[3] > 0)
+        if visible:
+            self.texture = self.layer.cache.get(
+                text, self.font_size, color, self.field_width, self.align)
+            self.alpha = color[3] if len(color) == 4 else 255
+
+        self.layer.set_visible(self, visible)
+        return True
+
+
+class TextLayer(arcade.SpriteList):
+    '''
+    All the labels on screen, drawn in one batch.
+
+    Only labels with something to show are kept in the list.
+    '''
+    def __init__(self, cache=None):
+        super().__init__()
+        self.cache = cache if cache is not None else TextCache()
+        self.cache.on_evict = self._forget_texture
+
+    def add_label(self, **kwargs):
+        return Label(self, **kwargs)
+
+    def set_visible(self, label, visible):
+        shown = self in label.sprite_lists
+        if visible and not shown:
+            self.append(label)
+        elif shown and not visible:
+            self.remove(label)
+
+    def _forget_texture(self, texture):
+        # SpriteList keeps every texture it ever packed in its atlas. When
+        # one of those is evicted, repack from the labels actually on screen
+        # so the atlas stays as bounded as the cache.
+        if texture.name in self.array_of_texture_names:
+            self.array_of_images = None
+            self._vao1 = None